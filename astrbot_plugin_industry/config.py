@@ -9,6 +9,25 @@ FOUNDATION_COST = 50000
 DATABASE_DIR = "data/plugin_data/industry"
 DATABASE_FILE = os.path.join(DATABASE_DIR, "industry.db")
 
+# 过期效果的后台批量清理间隔 (秒)
+EXPIRY_SWEEP_INTERVAL_SECONDS = 60
+
+# 定期运行 PRAGMA optimize 的间隔 (秒)，由过期效果清理任务顺带执行
+DB_OPTIMIZE_INTERVAL_SECONDS = 600
+
+# 排行榜查询上市公司市值时的最大并发请求数
+MARKET_CAP_FETCH_CONCURRENCY = 8
+
+# 效果写入的合并窗口 (秒)，窗口内的多次 add_effect 会合并为一次提交
+EFFECT_FLUSH_DELAY_SECONDS = 0.05
+
+# 公司数据读缓存的有效期 (秒) 与最大条目数，写操作会立即使对应条目失效
+COMPANY_CACHE_TTL_SECONDS = 1.0
+COMPANY_CACHE_MAX_SIZE = 256
+
+# 股价与市值查询结果的进程内缓存有效期 (秒)，本插件改变股价的操作会立即使对应条目失效
+STOCK_QUOTE_CACHE_TTL_SECONDS = 2.0
+
 # --- 公司改名配置 ---
 COMPANY_RENAME_COST = 100000
 
@@ -74,6 +93,20 @@ COMPANY_LEVELS = {
 # 获取最高等级
 MAX_LEVEL = max(COMPANY_LEVELS.keys())
 
+# 按等级下标预展开的公司数值表，热路径直接按下标取值 (下标0无对应等级，填0)
+LEVEL_ASSETS = [
+    COMPANY_LEVELS[lv]["assets"] if lv in COMPANY_LEVELS else 0
+    for lv in range(MAX_LEVEL + 1)
+]
+LEVEL_INCOME_PER_HOUR = [
+    COMPANY_LEVELS[lv]["income_per_hour"] if lv in COMPANY_LEVELS else 0
+    for lv in range(MAX_LEVEL + 1)
+]
+LEVEL_UPGRADE_COST = [
+    COMPANY_LEVELS[lv]["upgrade_cost"] if lv in COMPANY_LEVELS else 0
+    for lv in range(MAX_LEVEL + 1)
+]
+
 # 随机事件列表 (已更新为动态范围数值)
 # effect_type:
 #   - 'scaled_fixed': 效果值 = 随机基础值 * 公司等级
@@ -258,6 +291,22 @@ DEPARTMENT_LEVELS = {
     },  # +60%| -25%| +65%
 }
 
+# 按部门等级下标预展开的加成表 (下标0为未建立部门，加成为1.0)
+_MAX_DEPT_LEVEL = max(DEPARTMENT_LEVELS.keys())
+DEPT_OPS_BONUS = [1.0] + [
+    DEPARTMENT_LEVELS[lv]["operations_bonus"] for lv in range(1, _MAX_DEPT_LEVEL + 1)
+]
+DEPT_RES_BONUS = [1.0] + [
+    DEPARTMENT_LEVELS[lv]["research_bonus"] for lv in range(1, _MAX_DEPT_LEVEL + 1)
+]
+DEPT_PR_BONUS = [1.0] + [
+    DEPARTMENT_LEVELS[lv]["pr_bonus"] for lv in range(1, _MAX_DEPT_LEVEL + 1)
+]
+# 下标为目标等级的部门升级费用 (下标0无意义，为0)
+DEPT_UPGRADE_COST = [0] + [
+    DEPARTMENT_LEVELS[lv]["cost"] for lv in range(1, _MAX_DEPT_LEVEL + 1)
+]
+
 # --- 新增：玩家互动配置 ---
 # 人才挖角基础费用范围
 TALENT_POACH_COST_HOURS_RANGE = [5, 12]  # 挖角成本通常比刺探更高
@@ -400,3 +449,7 @@ TALENT_POACH_PUBLIC_DEBUFF = {
 # +++ 新增：市场公告广播配置 +++
 # 在这里填入您想作为“财经频道”的QQ群号，可以填多个
 BROADCAST_GROUP_IDS = ["1053208414", "1050550421", "625684997"]
+# 由群号预先生成的广播目标 UMO 字符串 (直接使用 "Napcat" 平台名)，无需修改
+BROADCAST_UMO_STRINGS = tuple(
+    f"Napcat:GroupMessage:{gid}" for gid in BROADCAST_GROUP_IDS
+)
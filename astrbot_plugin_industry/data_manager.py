@@ -1,112 +1,309 @@
 import aiosqlite
+import asyncio
 import os
+import sqlite3
 import time
-from typing import Optional, Dict, Any, List
-from .config import DATABASE_FILE, DATABASE_DIR
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+from .config import (
+    DATABASE_FILE,
+    DATABASE_DIR,
+    COMPANY_LEVELS,
+    EFFECT_FLUSH_DELAY_SECONDS,
+    COMPANY_CACHE_TTL_SECONDS,
+    COMPANY_CACHE_MAX_SIZE,
+)
 from astrbot.api import logger
 
+# 全局共享的长连接，避免每次调用都重新打开数据库、丢弃页缓存
+_db: Optional[aiosqlite.Connection] = None
+# 写操作锁，保证写语句不会混入其他协程已开启的显式事务
+_write_lock = asyncio.Lock()
+
+
+class _RecordAccess:
+    """为只读记录提供 record["field"] / record.get("field") 的旧式字典访问"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+
+@dataclass(frozen=True, slots=True)
+class Company(_RecordAccess):
+    """companies 表的一行，字段顺序与 _COMPANY_SELECT 的列顺序一致"""
+
+    user_id: str
+    name: str
+    level: int
+    created_at: int
+    last_income_claim_time: int
+    last_event_time: int
+    dept_ops_level: int
+    dept_res_level: int
+    dept_pr_level: int
+    dept_ops_alias: Optional[str]
+    dept_res_alias: Optional[str]
+    dept_pr_alias: Optional[str]
+    is_public: int
+    stock_ticker: Optional[str]
+    total_shares: int
+    last_earnings_report_time: int
+    last_corporate_action_time: int
+    last_profile_view_time: int
+
+
+@dataclass(frozen=True, slots=True)
+class Effect(_RecordAccess):
+    """active_effects 表的一行，字段顺序与 _EFFECT_SELECT 的列顺序一致"""
+
+    effect_id: int
+    user_id: str
+    origin_user_id: Optional[str]
+    effect_type: str
+    potency: float
+    expires_at: int
+    is_consumed_on_use: int
+    created_at: int
+    source_action: Optional[str]
+
+
+# 按数据类字段顺序显式列出查询列，旧库中字段的物理顺序可能不同，不能依赖 SELECT *
+_COMPANY_SELECT = f"SELECT {', '.join(f.name for f in fields(Company))} FROM companies"
+_EFFECT_SELECT = (
+    f"SELECT {', '.join(f.name for f in fields(Effect))} FROM active_effects"
+)
+
+# 连接上缓存的已编译语句数量 (sqlite3 默认 128)
+_STATEMENT_CACHE_SIZE = 256
+
+# 热路径上的查询语句在导入时拼好，每次调用传入同一个字符串，命中 sqlite3 的语句缓存
+_GET_COMPANY_SQL = f"{_COMPANY_SELECT} WHERE user_id = ?"
+
+# get_company 的短时读缓存: user_id -> (写入时间, 公司数据)
+_company_cache: Dict[str, Tuple[float, Company]] = {}
+# 每次公司写操作自增，避免与写并发的读把旧数据回填进缓存
+_company_write_version = 0
+
+
+def _invalidate_company_cache(user_id: str):
+    """使指定用户的公司缓存失效"""
+    global _company_write_version
+    _company_write_version += 1
+    _company_cache.pop(user_id, None)
+
+
+async def _get_db() -> aiosqlite.Connection:
+    """获取共享连接，若尚未建立则惰性创建"""
+    global _db
+    if _db is None:
+        os.makedirs(DATABASE_DIR, exist_ok=True)
+        # 自动提交模式：单条写语句自行提交，多语句写入显式使用 BEGIN IMMEDIATE
+        # 放大 sqlite3 的语句缓存，让热路径上的固定 SQL 始终复用已编译的语句
+        _db = await aiosqlite.connect(
+            DATABASE_FILE,
+            isolation_level=None,
+            cached_statements=_STATEMENT_CACHE_SIZE,
+        )
+        _db.row_factory = aiosqlite.Row
+        await _db.execute("PRAGMA journal_mode=WAL")
+        await _db.execute("PRAGMA synchronous=NORMAL")
+        # 限制 optimize 时单次 ANALYZE 扫描的行数，保证其开销可控
+        await _db.execute("PRAGMA analysis_limit=400")
+    return _db
+
+
+async def optimize_db():
+    """运行 PRAGMA optimize，让 SQLite 按需刷新统计信息以改进查询计划"""
+    try:
+        db = await _get_db()
+        async with _write_lock:
+            await db.execute("PRAGMA optimize")
+    except Exception as e:
+        logger.error(f"优化产业数据库失败: {e}")
+
+
+async def close_db():
+    """关闭共享连接，在插件卸载时调用"""
+    global _db
+    task = _flush_task
+    if task is not None:
+        # 效果批次仍在合并窗口内：取消等待并立即写入，
+        # 否则延迟写入会在连接关闭后重新打开一个不会再被关闭的连接
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await _write_pending_effects()
+    if _db is not None:
+        try:
+            await optimize_db()
+            await _db.close()
+        except Exception as e:
+            logger.error(f"关闭产业数据库连接失败: {e}")
+        finally:
+            _db = None
+
+
+# 当前 Unix 时间的 SQL 表达式，过期判断直接在数据库侧取时间，无需每次绑定参数
+# unixepoch() 需要 SQLite 3.38+，更旧的版本回退到 strftime
+_NOW_SQL = (
+    "unixepoch()"
+    if sqlite3.sqlite_version_info >= (3, 38, 0)
+    else "CAST(strftime('%s', 'now') AS INTEGER)"
+)
+
+# 私有公司资产价值的 SQL 表达式，由 COMPANY_LEVELS 在导入时生成，用于在数据库侧完成排行
+_PRIVATE_ASSETS_SQL = (
+    "CASE level "
+    + " ".join(
+        f"WHEN {int(level)} THEN {int(info['assets'])}"
+        for level, info in COMPANY_LEVELS.items()
+    )
+    + " ELSE 0 END"
+)
+
+# 当前数据库结构版本，每次新增字段/索引迁移时递增
+CURRENT_SCHEMA_VERSION = 4
+
+# 旧版数据库需要补充的字段: 字段名 -> 列定义
+_COMPANY_COLUMNS_TO_ADD = {
+    "dept_ops_level": "INTEGER NOT NULL DEFAULT 0",
+    "dept_res_level": "INTEGER NOT NULL DEFAULT 0",
+    "dept_pr_level": "INTEGER NOT NULL DEFAULT 0",
+    "dept_ops_alias": "TEXT DEFAULT NULL",
+    "dept_res_alias": "TEXT DEFAULT NULL",
+    "dept_pr_alias": "TEXT DEFAULT NULL",
+    "is_public": "INTEGER NOT NULL DEFAULT 0",
+    "stock_ticker": "TEXT DEFAULT NULL",
+    "total_shares": "INTEGER NOT NULL DEFAULT 0",
+    "last_earnings_report_time": "INTEGER NOT NULL DEFAULT 0",
+    "last_corporate_action_time": "INTEGER NOT NULL DEFAULT 0",
+    # +++ V3 新增：上次查看公司信息的时间戳 +++
+    "last_profile_view_time": "INTEGER NOT NULL DEFAULT 0",
+}
+_EFFECT_COLUMNS_TO_ADD = {
+    "origin_user_id": "TEXT DEFAULT NULL",
+    "is_consumed_on_use": "INTEGER NOT NULL DEFAULT 0",
+    # +++ V3 新增：效果创建时间戳 +++
+    "created_at": "INTEGER NOT NULL DEFAULT 0",
+    # 产生该效果的公司行动关键字 (CORPORATE_ACTIONS 的键)，其他来源为 NULL
+    "source_action": "TEXT DEFAULT NULL",
+}
+
+
+async def _add_missing_columns(
+    db: aiosqlite.Connection, table: str, columns_to_add: Dict[str, str]
+):
+    """检查并为旧版数据表补充缺失的字段"""
+    cursor = await db.execute("SELECT name FROM pragma_table_info(?)", (table,))
+    existing_columns = {row[0] for row in await cursor.fetchall()}
+    for col, col_def in columns_to_add.items():
+        if col not in existing_columns:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_def}")
+            logger.info(f"成功为 {table} 表添加 {col} 字段。")
+
+
+# 幂等的建表语句，合并为一个脚本一次性执行
+_CREATE_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS companies (
+    user_id TEXT PRIMARY KEY, name TEXT NOT NULL, level INTEGER NOT NULL DEFAULT 1,
+    created_at INTEGER NOT NULL, last_income_claim_time INTEGER NOT NULL,
+    last_event_time INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS active_effects (
+    effect_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,
+    origin_user_id TEXT DEFAULT NULL,
+    effect_type TEXT NOT NULL, potency REAL NOT NULL, expires_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ticker_sequence (
+    id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO ticker_sequence (id, value) VALUES (1, 0);
+"""
+
+# 幂等的建索引语句，末尾顺带让 SQLite 按需刷新统计信息
+# (user_id, effect_type, expires_at) 覆盖按用户+类型查询未过期效果的热路径，
+# 其 user_id 前缀也能服务按用户删除，因此取代了旧的 (user_id, expires_at) 索引
+_CREATE_INDEXES_SQL = """
+DROP INDEX IF EXISTS idx_effects_user_expires;
+CREATE INDEX IF NOT EXISTS idx_effects_user_type_expires ON active_effects(user_id, effect_type, expires_at);
+CREATE INDEX IF NOT EXISTS idx_effects_user_created_type ON active_effects(user_id, created_at, effect_type);
+CREATE INDEX IF NOT EXISTS idx_effects_expires ON active_effects(expires_at);
+PRAGMA optimize;
+"""
+
 
 async def init_db():
     """初始化数据库，创建并安全地更新所有表结构，确保数据兼容"""
     try:
-        os.makedirs(DATABASE_DIR, exist_ok=True)
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            # 步骤 1: 创建或更新 companies 表
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS companies (
-                    user_id TEXT PRIMARY KEY, name TEXT NOT NULL, level INTEGER NOT NULL DEFAULT 1,
-                    created_at INTEGER NOT NULL, last_income_claim_time INTEGER NOT NULL,
-                    last_event_time INTEGER NOT NULL DEFAULT 0
-                );
-            """)
-            cursor = await db.execute("PRAGMA table_info(companies)")
-            columns = {row[1] for row in await cursor.fetchall()}
-            if "dept_ops_level" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN dept_ops_level INTEGER NOT NULL DEFAULT 0"
-                )
-            if "dept_res_level" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN dept_res_level INTEGER NOT NULL DEFAULT 0"
-                )
-            if "dept_pr_level" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN dept_pr_level INTEGER NOT NULL DEFAULT 0"
-                )
-            if "dept_ops_alias" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN dept_ops_alias TEXT DEFAULT NULL"
-                )
-            if "dept_res_alias" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN dept_res_alias TEXT DEFAULT NULL"
-                )
-            if "dept_pr_alias" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN dept_pr_alias TEXT DEFAULT NULL"
-                )
-            if "is_public" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN is_public INTEGER NOT NULL DEFAULT 0"
-                )
-            if "stock_ticker" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN stock_ticker TEXT DEFAULT NULL"
-                )
-            if "total_shares" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN total_shares INTEGER NOT NULL DEFAULT 0"
-                )
-            if "last_earnings_report_time" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN last_earnings_report_time INTEGER NOT NULL DEFAULT 0"
-                )
-            if "last_corporate_action_time" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN last_corporate_action_time INTEGER NOT NULL DEFAULT 0"
-                )
-            # +++ V3 新增：上次查看公司信息的时间戳 +++
-            if "last_profile_view_time" not in columns:
-                await db.execute(
-                    "ALTER TABLE companies ADD COLUMN last_profile_view_time INTEGER NOT NULL DEFAULT 0"
-                )
-                logger.info("成功为 companies 表添加 last_profile_view_time 字段。")
-
-            # 步骤 2: 创建或更新 active_effects 表
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS active_effects (
-                    effect_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL,
-                    origin_user_id TEXT DEFAULT NULL,
-                    effect_type TEXT NOT NULL, potency REAL NOT NULL, expires_at INTEGER NOT NULL
-                );
-            """)
-
-            cursor = await db.execute("PRAGMA table_info(active_effects)")
-            columns_in_effects = {row[1] for row in await cursor.fetchall()}
-
-            if "origin_user_id" not in columns_in_effects:
-                await db.execute(
-                    "ALTER TABLE active_effects ADD COLUMN origin_user_id TEXT DEFAULT NULL"
+        db = await _get_db()
+        async with _write_lock:
+            # 步骤 1: 创建基础表
+            await db.executescript(_CREATE_TABLES_SQL)
+
+            # 步骤 2: 按 user_version 判断是否需要迁移，已是最新结构时跳过全部字段检查
+            cursor = await db.execute("PRAGMA user_version")
+            schema_version = (await cursor.fetchone())[0]
+            if schema_version < CURRENT_SCHEMA_VERSION:
+                await db.execute("BEGIN IMMEDIATE")
+                try:
+                    if schema_version < 1:
+                        await _add_missing_columns(
+                            db, "companies", _COMPANY_COLUMNS_TO_ADD
+                        )
+                        await _add_missing_columns(
+                            db, "active_effects", _EFFECT_COLUMNS_TO_ADD
+                        )
+                    if schema_version < 2:
+                        # 非消耗型效果按 (目标, 类型, 来源, 增益/减益) 唯一，先清理历史重复行，
+                        # 唯一索引在 v4 步骤中创建
+                        # 唯一索引中 NULL 互不相等，无来源的效果本就允许叠加，不参与去重
+                        await db.execute("""
+                            DELETE FROM active_effects
+                            WHERE is_consumed_on_use = 0
+                              AND origin_user_id IS NOT NULL
+                              AND effect_id NOT IN (
+                                SELECT MAX(effect_id) FROM active_effects
+                                WHERE is_consumed_on_use = 0 AND origin_user_id IS NOT NULL
+                                GROUP BY user_id, effect_type, origin_user_id, potency >= 1
+                            )
+                        """)
+                    if schema_version < 3:
+                        await _add_missing_columns(
+                            db, "active_effects", _EFFECT_COLUMNS_TO_ADD
+                        )
+                    if schema_version < 4:
+                        # 以 potency 是否 >= 1 区分增益与减益，同一来源的同类增益和减益各占一行，
+                        # 旧索引键更严格，替换时无需再次去重
+                        await db.execute(
+                            "DROP INDEX IF EXISTS idx_effects_unique_lasting"
+                        )
+                        await db.execute("""
+                            CREATE UNIQUE INDEX IF NOT EXISTS idx_effects_unique_lasting_dir
+                            ON active_effects(user_id, effect_type, origin_user_id, potency >= 1)
+                            WHERE is_consumed_on_use = 0
+                        """)
+                    await db.execute(f"PRAGMA user_version = {CURRENT_SCHEMA_VERSION}")
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+                logger.info(
+                    f"数据库结构已从 v{schema_version} 迁移至 v{CURRENT_SCHEMA_VERSION}。"
                 )
 
-            if "is_consumed_on_use" not in columns_in_effects:
-                await db.execute(
-                    "ALTER TABLE active_effects ADD COLUMN is_consumed_on_use INTEGER NOT NULL DEFAULT 0"
-                )
-                logger.info("成功为 active_effects 表添加 is_consumed_on_use 字段。")
-
-            # +++ V3 新增：效果创建时间戳 +++
-            if "created_at" not in columns_in_effects:
-                await db.execute(
-                    "ALTER TABLE active_effects ADD COLUMN created_at INTEGER NOT NULL DEFAULT 0"
-                )
-                logger.info("成功为 active_effects 表添加 created_at 字段。")
-
-            await db.execute(
-                "CREATE INDEX IF NOT EXISTS idx_effects_user_expires ON active_effects(user_id, expires_at);"
-            )
-
-            await db.commit()
+            # 步骤 3: 索引依赖迁移补齐的字段，须在迁移之后创建
+            await db.executescript(_CREATE_INDEXES_SQL)
             logger.info("数据库结构检查与更新完成。")
     except Exception as e:
         logger.error(f"数据库初始化/更新失败: {e}")
@@ -116,7 +313,8 @@ async def create_company(user_id: str, company_info: Dict[str, Any]) -> bool:
     """异步创建一个新公司（已更新）"""
     try:
         current_time = int(time.time())
-        async with aiosqlite.connect(DATABASE_FILE) as db:
+        db = await _get_db()
+        async with _write_lock:
             await db.execute(
                 """INSERT INTO companies 
                    (user_id, name, level, created_at, last_income_claim_time, last_event_time, 
@@ -140,87 +338,276 @@ async def create_company(user_id: str, company_info: Dict[str, Any]) -> bool:
                     current_time,
                 ),
             )
-            await db.commit()
+            _invalidate_company_cache(user_id)
         return True
     except Exception as e:
         logger.error(f"创建公司(user_id={user_id})失败: {e}")
         return False
 
 
-async def get_company(user_id: str) -> Optional[Dict[str, Any]]:
-    """异步获取指定用户的公司数据"""
+async def get_company(user_id: str) -> Optional[Company]:
+    """异步获取指定用户的公司数据（带短时缓存，记录只读，可直接共享）"""
+    cached = _company_cache.get(user_id)
+    if cached and time.monotonic() - cached[0] < COMPANY_CACHE_TTL_SECONDS:
+        return cached[1]
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                "SELECT * FROM companies WHERE user_id = ?", (user_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+        version = _company_write_version
+        db = await _get_db()
+        async with db.execute(_GET_COMPANY_SQL, (user_id,)) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        company = Company(*row)
+        if version == _company_write_version:
+            if len(_company_cache) >= COMPANY_CACHE_MAX_SIZE:
+                _company_cache.pop(next(iter(_company_cache)))
+            _company_cache[user_id] = (time.monotonic(), company)
+        return company
     except Exception as e:
         logger.error(f"查询公司(user_id={user_id})失败: {e}")
         return None
 
 
-async def get_all_companies() -> List[Dict[str, Any]]:
-    """异步获取所有公司的信息"""
+async def get_top_private_companies(limit: int) -> List[aiosqlite.Row]:
+    """按固定资产从高到低获取前 limit 家私有公司，附带 private_value 字段"""
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                "SELECT * FROM companies ORDER BY level DESC, created_at ASC"
-            ) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+        db = await _get_db()
+        async with db.execute(
+            f"""SELECT user_id, name, level, is_public, stock_ticker,
+                       {_PRIVATE_ASSETS_SQL} AS private_value
+                FROM companies
+                WHERE is_public = 0
+                ORDER BY private_value DESC, created_at ASC
+                LIMIT ?""",
+            (limit,),
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return rows
     except Exception as e:
-        logger.error(f"查询所有公司失败: {e}")
+        logger.error(f"查询私有公司排行失败: {e}")
         return []
 
 
+async def get_public_companies() -> List[aiosqlite.Row]:
+    """获取所有上市公司 (数量通常很少，其价值需通过股票市场API计算)"""
+    try:
+        db = await _get_db()
+        async with db.execute(
+            """SELECT user_id, name, level, is_public, stock_ticker, total_shares
+               FROM companies WHERE is_public = 1"""
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return rows
+    except Exception as e:
+        logger.error(f"查询上市公司失败: {e}")
+        return []
+
+
+# update_company 的语句缓存: 字段集合 -> (SQL, 有序字段元组)
+# 实际使用的字段组合很少，缓存后可复用 SQLite 已编译的语句
+_update_stmt_cache: Dict[frozenset, Tuple[str, Tuple[str, ...]]] = {}
+
+
+def _build_update_company(
+    user_id: str, updates: Dict[str, Any]
+) -> Tuple[str, Tuple[Any, ...]]:
+    """生成更新公司字段的 SQL 与参数，SQL 按字段集合缓存"""
+    key = frozenset(updates)
+    cached = _update_stmt_cache.get(key)
+    if cached is None:
+        columns = tuple(sorted(updates))
+        set_clause = ", ".join(f"{col} = ?" for col in columns)
+        cached = (f"UPDATE companies SET {set_clause} WHERE user_id = ?", columns)
+        _update_stmt_cache[key] = cached
+    sql, columns = cached
+    return sql, tuple(updates[col] for col in columns) + (user_id,)
+
+
 async def update_company(user_id: str, updates: Dict[str, Any]) -> bool:
     """异步更新一个用户公司的特定字段"""
     if not updates:
         return True
 
-    set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
-    params = list(updates.values()) + [user_id]
+    sql, params = _build_update_company(user_id, updates)
+    try:
+        db = await _get_db()
+        async with _write_lock:
+            await db.execute(sql, params)
+            _invalidate_company_cache(user_id)
+        return True
+    except Exception as e:
+        logger.error(f"更新公司(user_id={user_id})失败: {e}")
+        return False
+
+
+async def claim_idle_income(user_id: str, last_claim_time: int, now: int) -> bool:
+    """
+    以比较并交换的方式把挂机收益结算时间推进到 now。
+    只有结算时间仍是调用方读到的 last_claim_time 时才会成功，
+    并发的多次查看中只有一次能结算同一段收益。
+    """
+    try:
+        db = await _get_db()
+        async with _write_lock:
+            cursor = await db.execute(
+                """UPDATE companies SET last_income_claim_time = ?
+                   WHERE user_id = ? AND last_income_claim_time = ?""",
+                (now, user_id, last_claim_time),
+            )
+            _invalidate_company_cache(user_id)
+            return cursor.rowcount == 1
+    except Exception as e:
+        logger.error(f"结算公司(user_id={user_id})挂机收益失败: {e}")
+        return False
+
+
+async def update_company_and_consume_effects(
+    user_id: str, updates: Dict[str, Any], effect_ids: List[int]
+) -> bool:
+    """在同一个事务中更新公司字段并消耗指定的效果，二者要么都生效，要么都不生效"""
+    if not effect_ids:
+        return await update_company(user_id, updates)
 
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
+        db = await _get_db()
+        async with _write_lock:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                if updates:
+                    await db.execute(*_build_update_company(user_id, updates))
+                await db.executemany(
+                    "DELETE FROM active_effects WHERE effect_id = ?",
+                    [(effect_id,) for effect_id in effect_ids],
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            finally:
+                _invalidate_company_cache(user_id)
+        return True
+    except Exception as e:
+        logger.error(f"更新公司(user_id={user_id})并消耗效果失败: {e}")
+        return False
+
+
+async def get_ticker_seq() -> int:
+    """读取自动分配股票代码的下一个序号"""
+    try:
+        db = await _get_db()
+        async with db.execute(
+            "SELECT value FROM ticker_sequence WHERE id = 1"
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+    except Exception as e:
+        logger.error(f"读取股票代码序号失败: {e}")
+        return 0
+
+
+async def bump_ticker_seq() -> bool:
+    """将股票代码序号加一并持久化"""
+    try:
+        db = await _get_db()
+        async with _write_lock:
             await db.execute(
-                f"UPDATE companies SET {set_clause} WHERE user_id = ?", tuple(params)
+                "UPDATE ticker_sequence SET value = value + 1 WHERE id = 1"
             )
-            await db.commit()
         return True
     except Exception as e:
-        logger.error(f"更新公司(user_id={user_id})失败: {e}")
+        logger.error(f"更新股票代码序号失败: {e}")
         return False
 
 
 async def delete_company(user_id: str) -> bool:
     """异步删除指定用户的公司数据"""
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
+        db = await _get_db()
+        async with _write_lock:
             await db.execute("DELETE FROM companies WHERE user_id = ?", (user_id,))
-            await db.commit()
+            _invalidate_company_cache(user_id)
         return True
     except Exception as e:
         logger.error(f"删除公司(user_id={user_id})失败: {e}")
         return False
 
 
-async def delete_all_effects_for_user(user_id: str) -> bool:
-    """异步删除指定用户的所有效果数据"""
+async def delete_company_and_effects(user_id: str) -> bool:
+    """在同一个事务中删除指定用户的公司数据及其所有效果，二者要么都删除，要么都保留"""
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            await db.execute("DELETE FROM active_effects WHERE user_id = ?", (user_id,))
-            await db.commit()
+        db = await _get_db()
+        async with _write_lock:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                await db.execute(
+                    "DELETE FROM active_effects WHERE user_id = ?", (user_id,)
+                )
+                await db.execute("DELETE FROM companies WHERE user_id = ?", (user_id,))
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            finally:
+                _invalidate_company_cache(user_id)
         return True
     except Exception as e:
-        logger.error(f"删除用户 {user_id} 的所有效果失败: {e}")
+        logger.error(f"删除用户 {user_id} 的公司及效果数据失败: {e}")
         return False
 
 
+# 非消耗型效果命中唯一索引时原地刷新 (取更晚的过期时间)，消耗型效果照常插入并可叠加
+# 冲突键包含 potency >= 1，同一来源的增益不会被同类减益覆盖，反之亦然
+_INSERT_EFFECT_SQL = """INSERT INTO active_effects 
+   (user_id, effect_type, potency, expires_at, origin_user_id, is_consumed_on_use, created_at, source_action) 
+   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+   ON CONFLICT(user_id, effect_type, origin_user_id, potency >= 1)
+   WHERE is_consumed_on_use = 0
+   DO UPDATE SET potency = excluded.potency,
+                 expires_at = MAX(active_effects.expires_at, excluded.expires_at),
+                 created_at = excluded.created_at,
+                 source_action = excluded.source_action"""
+
+# 待写入的效果队列：短时间内的多次 add_effect 合并为一次 executemany + commit
+_pending_effects: List[tuple] = []
+_pending_waiters: List[asyncio.Future] = []
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def _flush_pending_effects():
+    """等待一个很短的窗口后，把队列中的效果一次性写入数据库"""
+    await asyncio.sleep(EFFECT_FLUSH_DELAY_SECONDS)
+    await _write_pending_effects()
+
+
+async def _write_pending_effects():
+    """把队列中的效果一次性写入数据库并唤醒所有等待者"""
+    global _pending_effects, _pending_waiters, _flush_task
+    batch, waiters = _pending_effects, _pending_waiters
+    _pending_effects, _pending_waiters = [], []
+    _flush_task = None
+    if not batch:
+        return
+
+    ok = True
+    try:
+        db = await _get_db()
+        async with _write_lock:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                await db.executemany(_INSERT_EFFECT_SQL, batch)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+    except Exception as e:
+        ok = False
+        logger.error(f"批量写入 {len(batch)} 条效果失败: {e}")
+
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.set_result(ok)
+
+
 async def add_effect(
     user_id: str,
     effect_type: str,
@@ -228,92 +615,125 @@ async def add_effect(
     duration_seconds: int,
     origin_user_id: Optional[str] = None,
     is_consumed_on_use: bool = False,
+    source_action: Optional[str] = None,
 ):
-    """为用户添加一个有时效性的效果 (V3 - 增加创建时间)"""
+    """
+    为用户添加一个有时效性的效果 (V3 - 增加创建时间)。
+    source_action 记录产生该效果的公司行动关键字，便于结算时直接显示行动名称。
+    写入会与同一时间窗口内的其他效果合并提交，返回时数据已落库；
+    该函数不返回 effect_id，需要立即拿到主键的场景请直接执行单条 INSERT。
+    """
+    global _flush_task
     now = int(time.time())
     expires_at = now + duration_seconds
+    waiter = asyncio.get_running_loop().create_future()
+    _pending_effects.append(
+        (
+            user_id,
+            effect_type,
+            potency,
+            expires_at,
+            origin_user_id,
+            is_consumed_on_use,
+            now,
+            source_action,
+        )
+    )
+    _pending_waiters.append(waiter)
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_pending_effects())
+
+    if not await waiter:
+        logger.error(f"为用户 {user_id} 添加效果失败")
+
+
+_GET_ACTIVE_EFFECTS_SQL = (
+    f"{_EFFECT_SELECT} WHERE user_id = ? AND effect_type = ? "
+    f"AND expires_at > {_NOW_SQL}"
+)
+
+
+@lru_cache(maxsize=None)
+def _active_effects_multi_sql(type_count: int) -> str:
+    """按效果类型数量生成并缓存 get_active_effects_multi 的查询语句"""
+    placeholders = ", ".join("?" * type_count)
+    return (
+        f"{_EFFECT_SELECT} WHERE user_id = ? AND effect_type IN ({placeholders}) "
+        f"AND expires_at > {_NOW_SQL}"
+    )
+
+
+_GET_NEW_DEBUFFS_SQL = f"""{_EFFECT_SELECT}
+   WHERE user_id = ? AND created_at > ? AND expires_at > {_NOW_SQL}
+   AND effect_type IN ('income_modifier', 'cost_modifier')
+   AND (effect_type = 'cost_modifier' OR potency < 1.0)
+   ORDER BY created_at DESC"""
+
+
+async def get_active_effects(user_id: str, effect_type: str) -> List[Effect]:
+    """获取用户所有未过期的指定类型效果"""
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            await db.execute(
-                """INSERT INTO active_effects 
-                   (user_id, effect_type, potency, expires_at, origin_user_id, is_consumed_on_use, created_at) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    user_id,
-                    effect_type,
-                    potency,
-                    expires_at,
-                    origin_user_id,
-                    is_consumed_on_use,
-                    now,
-                ),
-            )
-            await db.commit()
+        db = await _get_db()
+        cursor = await db.execute(_GET_ACTIVE_EFFECTS_SQL, (user_id, effect_type))
+        return [Effect(*row) for row in await cursor.fetchall()]
     except Exception as e:
-        logger.error(f"为用户 {user_id} 添加效果失败: {e}")
+        logger.error(f"获取用户 {user_id} 的活动效果失败: {e}")
+        return []
 
 
-async def get_active_effects(user_id: str, effect_type: str) -> List[Dict]:
-    """获取用户所有未过期的指定类型效果"""
-    now = int(time.time())
+async def get_active_effects_multi(
+    user_id: str, effect_types: List[str]
+) -> Dict[str, List[Effect]]:
+    """一次查询获取用户多种类型的未过期效果，按类型分组返回（未命中的类型为空列表）"""
+    grouped: Dict[str, List[Effect]] = {t: [] for t in effect_types}
+    if not effect_types:
+        return grouped
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT * FROM active_effects WHERE user_id = ? AND effect_type = ? AND expires_at > ?",
-                (user_id, effect_type, now),
-            )
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+        db = await _get_db()
+        cursor = await db.execute(
+            _active_effects_multi_sql(len(effect_types)), (user_id, *effect_types)
+        )
+        for row in await cursor.fetchall():
+            effect = Effect(*row)
+            grouped[effect.effect_type].append(effect)
     except Exception as e:
-        logger.error(f"获取用户 {user_id} 的活动效果失败: {e}")
-        return []
+        logger.error(f"获取用户 {user_id} 的多类活动效果失败: {e}")
+    return grouped
 
 
 # +++ V3 新增：查询新收到的debuff +++
-async def get_new_debuffs_since(user_id: str, timestamp: int) -> List[Dict]:
+async def get_new_debuffs_since(user_id: str, timestamp: int) -> List[Effect]:
     """获取用户自指定时间戳后收到的新debuff"""
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                """SELECT * FROM active_effects
-                   WHERE user_id = ? AND created_at > ?
-                   AND (
-                       (effect_type = 'income_modifier' AND potency < 1.0) OR
-                       (effect_type = 'cost_modifier')
-                   )
-                   ORDER BY created_at DESC""",
-                (user_id, timestamp),
-            )
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+        db = await _get_db()
+        cursor = await db.execute(_GET_NEW_DEBUFFS_SQL, (user_id, timestamp))
+        return [Effect(*row) for row in await cursor.fetchall()]
     except Exception as e:
         logger.error(f"查询用户 {user_id} 的新debuff失败: {e}")
         return []
 
 
-async def clear_expired_effects(user_id: str):
-    """清理用户所有已过期的效果"""
-    now = int(time.time())
+async def clear_all_expired_effects() -> int:
+    """清理所有用户已过期的效果，由后台定时任务统一调用，返回删除的条数"""
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
-            await db.execute(
-                "DELETE FROM active_effects WHERE user_id = ? AND expires_at <= ?",
-                (user_id, now),
+        db = await _get_db()
+        async with _write_lock:
+            cursor = await db.execute(
+                f"DELETE FROM active_effects WHERE expires_at <= {_NOW_SQL}"
             )
-            await db.commit()
+            return cursor.rowcount
     except Exception as e:
-        logger.error(f"清理用户 {user_id} 的过期效果失败: {e}")
+        logger.error(f"批量清理过期效果失败: {e}")
+        return 0
 
 
 async def consume_effect(effect_id: int):
     """根据主键ID消耗一个效果"""
     try:
-        async with aiosqlite.connect(DATABASE_FILE) as db:
+        db = await _get_db()
+        async with _write_lock:
             await db.execute(
                 "DELETE FROM active_effects WHERE effect_id = ?", (effect_id,)
             )
-            await db.commit()
     except Exception as e:
         logger.error(f"消耗效果 (id={effect_id}) 失败: {e}")
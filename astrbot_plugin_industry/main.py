@@ -1,5 +1,8 @@
 # astrbot_plugin_industry/main.py
 import asyncio
+import heapq
+import re
+import time
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
@@ -7,7 +10,20 @@ from ..common.services import shared_services
 from . import data_manager, config
 from .service import CompanyService
 import astrbot.api.message_components as Comp
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+
+# 从消息文本中解析目标玩家ID（5位以上的纯数字）
+_TARGET_RE = re.compile(r"\b(\d{5,})\b")
+
+
+def _extract_target(event: AstrMessageEvent) -> Optional[str]:
+    """从消息中提取目标玩家ID：优先取第一个 @，否则取文本中的第一个数字ID"""
+    for component in event.message_obj.message:
+        if isinstance(component, Comp.At):
+            return component.qq
+    match = _TARGET_RE.search(event.message_str)
+    return match.group(1) if match else None
 
 
 class IndustryAPI:
@@ -57,74 +73,159 @@ class IndustryPlugin(Star):
         shared_services["industry_api"] = self.api
         logger.info("虚拟产业API (industry_api) 已成功注册。")
 
+        # 后台统一清理过期效果，代替每条指令里按用户逐个清理
+        self._expiry_sweeper_task = asyncio.create_task(self._expiry_sweeper())
+
+    async def _expiry_sweeper(self):
+        """每隔固定时间批量删除所有已过期的效果，并定期优化数据库"""
+        last_optimize = time.monotonic()
+        while True:
+            await asyncio.sleep(config.EXPIRY_SWEEP_INTERVAL_SECONDS)
+            try:
+                removed = await data_manager.clear_all_expired_effects()
+                if removed:
+                    logger.debug(f"[产业插件] 已清理 {removed} 条过期效果。")
+                if (
+                    time.monotonic() - last_optimize
+                    >= config.DB_OPTIMIZE_INTERVAL_SECONDS
+                ):
+                    await data_manager.optimize_db()
+                    last_optimize = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[产业插件] 定时清理过期效果失败: {e}")
+
+    @staticmethod
+    def _value_from_row(
+        company: Dict[str, Any], market_cap: Optional[float] = None
+    ) -> int:
+        """根据公司数据计算资产价值：上市公司取传入的市值，私有公司取等级固定资产"""
+        if company["is_public"]:
+            # 如果API或市值获取失败，返回0作为安全默认值
+            return int(market_cap) if market_cap is not None else 0
+        # 私有公司，价值是固定资产
+        return config.LEVEL_ASSETS[company["level"]]
+
+    async def _fetch_market_cap(self, stock_api, ticker: str) -> Optional[float]:
+        """安全地调用股票API获取市值，出错时返回 None"""
+        try:
+            return await stock_api.get_market_cap(ticker)
+        except Exception as e:
+            logger.error(
+                f"调用 stock_api.get_market_cap 时发生错误: {e}", exc_info=True
+            )
+            return None
+
+    async def _fetch_market_caps(
+        self, stock_api, tickers: List[str]
+    ) -> Dict[str, Optional[float]]:
+        """批量获取一组股票的市值，结果仅在本次调用内有效
+
+        优先使用股票API的 get_market_caps 批量接口；不支持时对去重后的代码
+        并发逐个查询，并用信号量限制同时在途的请求数。
+        """
+        unique_tickers = list(dict.fromkeys(t for t in tickers if t))
+        if not unique_tickers:
+            return {}
+
+        if hasattr(stock_api, "get_market_caps"):
+            try:
+                caps = await stock_api.get_market_caps(unique_tickers)
+                return {t: caps.get(t) for t in unique_tickers}
+            except Exception as e:
+                logger.error(
+                    f"调用 stock_api.get_market_caps 时发生错误，改为逐个查询: {e}",
+                    exc_info=True,
+                )
+
+        semaphore = asyncio.Semaphore(config.MARKET_CAP_FETCH_CONCURRENCY)
+
+        async def fetch(ticker: str) -> Optional[float]:
+            async with semaphore:
+                return await self._fetch_market_cap(stock_api, ticker)
+
+        caps = await asyncio.gather(*(fetch(t) for t in unique_tickers))
+        return dict(zip(unique_tickers, caps))
+
+    def _get_stock_api(self):
+        """获取股票市场API，确保API和 get_market_cap 方法都存在"""
+        stock_api = shared_services.get("stock_market_api")
+        if stock_api and hasattr(stock_api, "get_market_cap"):
+            return stock_api
+        return None
+
     async def get_asset_value_for_api(self, user_id: str) -> int:
         """供API调用的内部方法，用于查询公司资产 (V3 - 统一调用市值API)"""
         company = await data_manager.get_company(user_id)
         if not company:
             return 0
 
+        market_cap = None
         if company.get("is_public"):
             # 如果是上市公司，其价值是市值
-            stock_api = shared_services.get("stock_market_api")
-            if stock_api and hasattr(
-                stock_api, "get_market_cap"
-            ):  # 确保API和方法都存在
-                try:
-                    market_cap = await stock_api.get_market_cap(company["stock_ticker"])
-                    if market_cap is not None:
-                        return int(market_cap)
-                except Exception as e:
-                    logger.error(
-                        f"调用 stock_api.get_market_cap 时发生错误: {e}", exc_info=True
-                    )
-
-            # 如果API或市值获取失败，返回0作为安全默认值
-            return 0
-        else:
-            # 私有公司，价值是固定资产
-            level = company.get("level", 1)
-            return config.COMPANY_LEVELS.get(level, {}).get("assets", 0)
+            stock_api = self._get_stock_api()
+            if stock_api:
+                market_cap = await self._fetch_market_cap(
+                    stock_api, company["stock_ticker"]
+                )
+        return self._value_from_row(company, market_cap)
 
     async def _get_top_companies_for_api(self, limit: int = 10) -> List[Dict[str, Any]]:
         """[内部方法] 计算所有公司的资产价值并返回前 N 名，供API调用。"""
-        # 1. 获取所有公司的基础信息
-        all_companies = await data_manager.get_all_companies()
-        if not all_companies:
+        # 1. 私有公司的价值只取决于等级，直接由数据库排序并截取前 limit 名；
+        #    上市公司数量通常很少，单独取出后查询市值
+        private_top, public_companies = await asyncio.gather(
+            data_manager.get_top_private_companies(limit),
+            data_manager.get_public_companies(),
+        )
+        if not private_top and not public_companies:
             return []
 
-        # 2. 使用 asyncio.gather 并发计算所有公司的当前资产价值，以提高效率
-        tasks = [
-            self.get_asset_value_for_api(company["user_id"])
-            for company in all_companies
-        ]
-        asset_values = await asyncio.gather(*tasks)
-
-        # 3. 将公司信息和其对应的资产价值配对
-        company_data_with_value = []
-        for i, company in enumerate(all_companies):
-            value = asset_values[i]
-            if value > 0:  # 只包含有实际价值的公司
-                company_data_with_value.append(
-                    {
-                        "user_id": company["user_id"],
-                        "company_name": company["name"],
-                        "asset_value": value,
-                    }
-                )
+        # 2. 仅对上市公司查询市值，同一股票代码只查一次
+        market_caps: Dict[str, Optional[float]] = {}
+        stock_api = self._get_stock_api() if public_companies else None
+        if stock_api:
+            market_caps = await self._fetch_market_caps(
+                stock_api, [c["stock_ticker"] for c in public_companies]
+            )
 
-        # 4. 按资产价值从高到低排序
-        sorted_companies = sorted(
-            company_data_with_value, key=lambda x: x["asset_value"], reverse=True
-        )
+        # 3. 边计算资产价值边维护大小为 limit 的小顶堆，只保留有实际价值的公司
+        #    堆元素为 (价值, -序号, user_id, 公司名)，序号保证同价值时先出现者优先
+        heap: List[tuple] = []
+
+        def push(seq: int, user_id: str, name: str, value: int):
+            if value <= 0:
+                return
+            item = (value, -seq, user_id, name)
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heappushpop(heap, item)
+
+        for seq, company in enumerate(private_top):
+            push(seq, company["user_id"], company["name"], company["private_value"])
+        for seq, company in enumerate(public_companies, start=len(private_top)):
+            value = self._value_from_row(
+                company, market_caps.get(company["stock_ticker"])
+            )
+            push(seq, company["user_id"], company["name"], value)
 
-        # 5. 返回排序后的前 limit 名
-        return sorted_companies[:limit]
+        # 4. 按价值从高到低输出
+        return [
+            {"user_id": user_id, "company_name": name, "asset_value": value}
+            for value, _, user_id, name in heapq.nlargest(limit, heap)
+        ]
 
     async def terminate(self):
-        """插件被卸载/停用时调用，清理shared_services中的API实例"""
+        """插件被卸载/停用时调用，清理shared_services中的API实例并关闭数据库连接"""
+        if self._expiry_sweeper_task and not self._expiry_sweeper_task.done():
+            self._expiry_sweeper_task.cancel()
+        await self.service.shutdown()
         if shared_services.get("industry_api") == self.api:
             del shared_services["industry_api"]
             logger.info("虚拟产业API (industry_api) 已成功注销。")
+        await data_manager.close_db()
 
     @filter.on_astrbot_loaded()
     async def on_astrbot_loaded(self):
@@ -241,19 +342,7 @@ class IndustryPlugin(Star):
     @filter.command("挖角", alias={"挖掘"})
     async def talent_poach_handler(self, event: AstrMessageEvent):
         """对其他玩家的公司发起人才挖角。"""
-        target_id = None
-        # 优先处理 @
-        for component in event.message_obj.message:
-            if isinstance(component, Comp.At):
-                target_id = component.qq
-                break
-
-        # 如果没有 @，尝试从文本中解析 ID
-        if not target_id:
-            parts = event.message_str.strip().split()
-            if len(parts) > 1 and parts[1].isdigit():
-                target_id = parts[1]
-
+        target_id = _extract_target(event)
         if not target_id:
             yield event.plain_result(
                 "请 @ 一位玩家或提供其ID。例如：\n/挖角 @张三\n/挖角 12345678"
@@ -266,19 +355,7 @@ class IndustryPlugin(Star):
     @filter.command("刺探", alias={"商业间谍"})
     async def industrial_espionage_handler(self, event: AstrMessageEvent):
         """对其他玩家的公司发起商业刺探。"""
-        target_id = None
-        # 优先处理 @
-        for component in event.message_obj.message:
-            if isinstance(component, Comp.At):
-                target_id = component.qq
-                break
-
-        # 如果没有 @，尝试从文本中解析 ID
-        if not target_id:
-            parts = event.message_str.strip().split()
-            if len(parts) > 1 and parts[1].isdigit():
-                target_id = parts[1]
-
+        target_id = _extract_target(event)
         if not target_id:
             yield event.plain_result(
                 "请 @ 一位玩家或提供其ID。例如：\n/刺探 @张三\n/刺探 12345678"
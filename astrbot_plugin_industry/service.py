@@ -1,9 +1,16 @@
 # astrbot_plugin_industry/service.py
 
+import math
+import re
 import time
 import random
 import asyncio
-from typing import Optional, Dict, List
+import bisect
+import heapq
+import itertools
+from dataclasses import replace
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple
 from ..common.services import shared_services
 from astrbot.api import logger
 from astrbot.api.star import Star
@@ -11,6 +18,182 @@ from . import data_manager
 from . import config
 from collections import defaultdict
 
+# 自定义股票代码：2到5位大写英文字母
+_TICKER_RE = re.compile(r"[A-Z]{2,5}")
+
+
+def _format_hm(seconds: float) -> str:
+    """将剩余秒数格式化为「X小时 Y分钟」"""
+    # 冷却配置可能是浮点数 (如 86400 / 2)，先取整一次
+    seconds = int(seconds)
+    return f"{seconds // 3600}小时 {seconds % 3600 // 60}分钟"
+
+
+@lru_cache(maxsize=256)
+def _validate_ticker(raw: str) -> Tuple[bool, str]:
+    """校验用户自定义的股票代码，返回 (是否有效, 规范化后的代码或错误提示)"""
+    ticker = raw.upper()
+    if not _TICKER_RE.fullmatch(ticker):
+        return False, f"❌ 无效的股票代码「{raw}」。代码必须是2到5位纯英文字母。"
+    return True, ticker
+
+
+# 自动分配的股票代码长度，及其可编码的序号总数 (超出后不再回绕复用旧代码)
+_AUTO_TICKER_LENGTH = 4
+_AUTO_TICKER_SPACE = 26**_AUTO_TICKER_LENGTH
+
+
+# 旧版效果没有记录来源行动时，按加成区间反查行动名称：区间按下限排序后二分查找，
+# 区间重叠时下限较高者优先（当前配置中即「投资研发」，与原先按配置顺序匹配的结果一致）
+_CORPORATE_ACTION_INTERVALS = sorted(
+    (
+        action["earnings_bonus_range"][0],
+        action["earnings_bonus_range"][1],
+        action["name"],
+    )
+    for action in config.CORPORATE_ACTIONS.values()
+)
+_CORPORATE_ACTION_LOWS = [interval[0] for interval in _CORPORATE_ACTION_INTERVALS]
+
+
+def _corporate_action_name(effect) -> Optional[str]:
+    """返回产生该财报加成效果的公司行动名称，无法识别时返回 None"""
+    action = config.CORPORATE_ACTIONS.get(effect["source_action"])
+    if action:
+        return action["name"]
+    potency = effect["potency"]
+    i = bisect.bisect_right(_CORPORATE_ACTION_LOWS, potency) - 1
+    if i >= 0 and _CORPORATE_ACTION_INTERVALS[i][1] >= potency:
+        return _CORPORATE_ACTION_INTERVALS[i][2]
+    return None
+
+
+# 随机事件池的累积权重在导入时算好，抽取时直接传给 random.choices 的 cum_weights
+_PRIVATE_EVENT_POOL = (
+    config.RANDOM_EVENTS,
+    tuple(itertools.accumulate(e.get("weight", 1) for e in config.RANDOM_EVENTS)),
+)
+_PUBLIC_EVENT_POOL = (
+    config.PUBLIC_RANDOM_EVENTS,
+    tuple(
+        itertools.accumulate(e.get("weight", 1) for e in config.PUBLIC_RANDOM_EVENTS)
+    ),
+)
+
+
+# 部门标准名 -> 数据库字段名
+_DEPT_NAME_MAP = {
+    "运营部": "dept_ops_level",
+    "研发部": "dept_res_level",
+    "公关部": "dept_pr_level",
+}
+_LEVEL_TO_ALIAS_FIELD = {
+    "dept_ops_level": "dept_ops_alias",
+    "dept_res_level": "dept_res_alias",
+    "dept_pr_level": "dept_pr_alias",
+}
+
+
+@lru_cache(maxsize=4096)
+def _resolve_dept_alias_cached(
+    ops_alias: Optional[str],
+    res_alias: Optional[str],
+    pr_alias: Optional[str],
+    name_or_alias: str,
+) -> Optional[str]:
+    """按公司的三个部门别名解析部门名，结果只取决于参数，可直接缓存"""
+    # 别名 -> 标准名 映射，跳过未设置的别名，防止用户别名恰好是 "None" 字符串时出问题
+    alias_map = {
+        alias: field
+        for alias, field in (
+            (ops_alias, "dept_ops_level"),
+            (res_alias, "dept_res_level"),
+            (pr_alias, "dept_pr_level"),
+        )
+        if alias is not None
+    }
+    # 优先匹配别名，再匹配标准名，找不到匹配时为 None
+    return alias_map.get(name_or_alias) or _DEPT_NAME_MAP.get(name_or_alias)
+
+
+# 人才挖角成功时的结果模板
+_POACH_SATURATED_TMPL = (
+    "✅ 挖角成功 (成功率: {chance:.0%})！\n"
+    "但目标公司已是人心惶惶，人才流失严重，你的行动未能造成进一步影响。\n"
+    "💵 行动费用: -{cost:,.0f} 金币。"
+)
+_POACH_PUBLIC_SUCCESS_TMPL = (
+    "✅ 挖角成功 (成功率: {chance:.0%})！\n"
+    "目标上市公司的核心团队出现动荡，股价受到冲击，且下次财报业绩将受到 {debuff:.1%} 的负面影响！\n"
+    "同时，在接下来{hours}小时内，您的公司时薪将获得 +{buff:.0%} 的加成。\n"
+    "💵 行动费用: -{cost:,.0f} 金币。"
+)
+_POACH_PRIVATE_SUCCESS_TMPL = (
+    "✅ 挖角成功 (成功率: {chance:.0%})！\n"
+    "在接下来{hours}小时内，您的公司时薪将获得 +{buff:.0f}% 的加成，而对方公司将遭受 -{debuff:.0f}% 的损失。\n"
+    "💵 行动费用: -{cost:,.0f} 金币。"
+)
+
+
+# 商业刺探各随机区间的 (下限, 跨度)，抽样时直接计算 下限 + 跨度 * random()，与 random.uniform 结果一致
+_ESPIONAGE_COST_HOURS_LO, _ESPIONAGE_COST_HOURS_SPAN = (
+    config.INDUSTRIAL_ESPIONAGE_COST_HOURS_RANGE[0],
+    config.INDUSTRIAL_ESPIONAGE_COST_HOURS_RANGE[1]
+    - config.INDUSTRIAL_ESPIONAGE_COST_HOURS_RANGE[0],
+)
+_ESPIONAGE_REWARD_LO, _ESPIONAGE_REWARD_SPAN = (
+    config.INDUSTRIAL_ESPIONAGE_REWARD_COST_MULTIPLIER_RANGE[0],
+    config.INDUSTRIAL_ESPIONAGE_REWARD_COST_MULTIPLIER_RANGE[1]
+    - config.INDUSTRIAL_ESPIONAGE_REWARD_COST_MULTIPLIER_RANGE[0],
+)
+_ESPIONAGE_DEBUFF_LO, _ESPIONAGE_DEBUFF_SPAN = (
+    config.INDUSTRIAL_ESPIONAGE_DEBUFF_POTENCY_RANGE[0],
+    config.INDUSTRIAL_ESPIONAGE_DEBUFF_POTENCY_RANGE[1]
+    - config.INDUSTRIAL_ESPIONAGE_DEBUFF_POTENCY_RANGE[0],
+)
+_ESPIONAGE_PENALTY_LO, _ESPIONAGE_PENALTY_SPAN = (
+    config.INDUSTRIAL_ESPIONAGE_PENALTY_MULTIPLIER_RANGE[0],
+    config.INDUSTRIAL_ESPIONAGE_PENALTY_MULTIPLIER_RANGE[1]
+    - config.INDUSTRIAL_ESPIONAGE_PENALTY_MULTIPLIER_RANGE[0],
+)
+
+# 商业刺探成功率的上下限
+_ESPIONAGE_CHANCE_MIN = config.ESPIONAGE_CHANCE_MIN
+_ESPIONAGE_CHANCE_MAX = config.ESPIONAGE_CHANCE_MAX
+
+# 商业刺探的结果模板
+_ESPIONAGE_SATURATED_TMPL = (
+    "✅ 破坏成功 (成功率: {chance:.0%})！\n"
+    "但目标公司的技术已被全面封锁，你的行动未能造成进一步影响。\n"
+    "--------------------\n"
+    "💵 行动投资: -{cost:,.0f} 金币\n"
+    "💰 投资回报: +{reward:,.0f} 金币！"
+)
+_ESPIONAGE_SUCCESS_TMPL = (
+    "✅ 破坏成功 (成功率: {chance:.0%})！\n"
+    "您对目标公司造成了严重的商业打击！\n"
+    "--------------------\n"
+    "💵 行动投资: -{cost:,.0f} 金币\n"
+    "💰 投资回报: +{reward:,.0f} 金币！\n"
+    "🎯 目标已陷入“技术封锁”，下次升级或改名成本将增加！"
+)
+_ESPIONAGE_FAILURE_TMPL = (
+    "❌ 刺探失败 (成功率: {chance:.0%})！\n"
+    "行动已暴露！你的计划不仅让你损失了 {cost:,.0f} 金币的投资，"
+    "还被处以 {penalty:,.0f} 金币的巨额罚款！\n"
+    "--------------------\n"
+    "🛡️ 目标公司加强了安保措施，在接下来的一段时间内将更难被刺探。"
+)
+
+
+def _encode_ticker(n: int) -> str:
+    """将序号编码为定长的大写字母股票代码 (0 -> AAAA, 1 -> AAAB, ...)"""
+    out = []
+    for _ in range(_AUTO_TICKER_LENGTH):
+        n, rem = divmod(n, 26)
+        out.append(chr(ord("A") + rem))
+    return "".join(reversed(out))
+
 
 class CompanyService:
     def __init__(self, plugin_instance: Star):
@@ -18,43 +201,35 @@ class CompanyService:
         self.economy_api = None
         self.nickname_api = None
         self.stock_api = None
+        # 持有后台任务的引用，防止其在完成前被垃圾回收
+        self._background_tasks: set = set()
+        # 待完成的上市公司升级：(到期时间, user_id, 原等级) 小顶堆，由单个调度任务统一处理
+        self._upgrade_heap: List[Tuple[float, str, int]] = []
+        self._upgrade_wakeup = asyncio.Event()
+        self._upgrade_scheduler_task: Optional[asyncio.Task] = None
+        # 股价/市值短时缓存：ticker -> (值, 过期时间)
+        self._price_cache: Dict[str, Tuple[float, float]] = {}
+        self._market_cap_cache: Dict[str, Tuple[float, float]] = {}
+        # 自动分配股票代码的序号，首次使用时从数据库加载
+        self._ticker_counter: Optional[int] = None
         asyncio.create_task(self.initialize())
 
     async def initialize(self) -> bool:
         """异步初始化服务，等待依赖API"""
         logger.info("[产业插件] 正在等待经济系统API加载...")
-        timeout_seconds = 30
-        start_time = asyncio.get_event_loop().time()
-
-        while self.economy_api is None:
-            self.economy_api = shared_services.get("economy_api")
-            if self.economy_api is not None:
-                logger.info("[产业插件] 经济系统API已成功加载。")
-                break
-
-            if asyncio.get_event_loop().time() - start_time > timeout_seconds:
-                logger.error(
-                    "[产业插件] 等待经济系统API超时！虚拟产业插件将无法正常工作！"
-                )
-                return False
-
-            await asyncio.sleep(1)
+        self.economy_api = await shared_services.wait_for("economy_api", timeout=30)
+        if self.economy_api is None:
+            logger.error("[产业插件] 等待经济系统API超时！虚拟产业插件将无法正常工作！")
+            return False
+        logger.info("[产业插件] 经济系统API已成功加载。")
 
         logger.info("[产业插件] 正在等待股票市场API加载...")
-        timeout_seconds = 30
-        start_time = asyncio.get_event_loop().time()
-
-        while self.stock_api is None:
-            self.stock_api = shared_services.get("stock_market_api")
-            if self.stock_api is not None:
-                logger.info("[产业插件] 股票市场API已成功加载。")
-                break
-
-            if asyncio.get_event_loop().time() - start_time > timeout_seconds:
-                logger.warning("[产业插件] 等待股票市场API超时！上市相关功能将不可用。")
-                break  # 即使超时也要继续，不阻塞核心功能
-
-            await asyncio.sleep(1)
+        self.stock_api = await shared_services.wait_for("stock_market_api", timeout=30)
+        if self.stock_api is not None:
+            logger.info("[产业插件] 股票市场API已成功加载。")
+        else:
+            # 即使超时也要继续，不阻塞核心功能
+            logger.warning("[产业插件] 等待股票市场API超时！上市相关功能将不可用。")
 
         self.nickname_api = shared_services.get("nickname_api")
         if self.nickname_api:
@@ -64,23 +239,104 @@ class CompanyService:
 
         return True
 
-    def _generate_stock_ticker(self, company_name: str) -> str:
-        """根据公司名生成一个唯一的4位大写字母股票代码"""
-        # 这是一个简单的实现，你可以根据需要变得更复杂
-        import re
+    @staticmethod
+    async def _get_cached_quote(cache: dict, fetch, ticker: str):
+        """在有效期内返回缓存的行情值，否则调用 fetch 查询并缓存（查询失败的 None 不缓存）"""
+        now = time.time()
+        cached = cache.get(ticker)
+        if cached and cached[1] > now:
+            return cached[0]
+        value = await fetch(ticker)
+        if value is not None:
+            cache[ticker] = (value, now + config.STOCK_QUOTE_CACHE_TTL_SECONDS)
+        return value
+
+    async def _get_price(self, ticker: str) -> Optional[float]:
+        return await self._get_cached_quote(
+            self._price_cache, self.stock_api.get_stock_price, ticker
+        )
+
+    async def _get_market_cap(self, ticker: str) -> Optional[float]:
+        return await self._get_cached_quote(
+            self._market_cap_cache, self.stock_api.get_market_cap, ticker
+        )
+
+    async def _get_prices(self, tickers: List[str]) -> Dict[str, float]:
+        """
+        批量获取股价：先取未过期的缓存，其余优先通过 get_stock_prices_batch 一次查询，
+        股票API不支持批量接口时并发逐个查询。查询失败的代码不出现在结果中。
+        """
+        now = time.time()
+        prices = {}
+        missing = []
+        for ticker in dict.fromkeys(tickers):
+            cached = self._price_cache.get(ticker)
+            if cached and cached[1] > now:
+                prices[ticker] = cached[0]
+            else:
+                missing.append(ticker)
+        if not missing:
+            return prices
 
-        # 提取所有汉字或字母
-        chars = re.findall("[\u4e00-\u9fa5a-zA-Z]", company_name)
-        if len(chars) >= 4:
-            ticker = "".join(random.sample(chars, 4)).upper()
+        batch_fetch = getattr(self.stock_api, "get_stock_prices_batch", None)
+        if batch_fetch:
+            fetched = await batch_fetch(missing)
         else:
-            ticker = "".join(random.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=4))
+            results = await asyncio.gather(
+                *(self.stock_api.get_stock_price(t) for t in missing)
+            )
+            fetched = dict(zip(missing, results))
+
+        expires_at = now + config.STOCK_QUOTE_CACHE_TTL_SECONDS
+        for ticker, price in fetched.items():
+            if price is not None:
+                prices[ticker] = price
+                self._price_cache[ticker] = (price, expires_at)
+        return prices
+
+    def _invalidate_quote(self, ticker: str):
+        """股价被本插件改变（财报、内在价值调整、退市）后调用"""
+        self._price_cache.pop(ticker, None)
+        self._market_cap_cache.pop(ticker, None)
+
+    async def _add_and_get(
+        self, user_id: str, amount: int, reason: str
+    ) -> Optional[int]:
+        """增减用户金币并返回新余额，失败时返回 None：经济系统支持时一次调用完成，否则先增减再查询"""
+        add_coins_returning = getattr(self.economy_api, "add_coins_returning", None)
+        if add_coins_returning:
+            return await add_coins_returning(user_id, amount, reason)
+        if not await self.economy_api.add_coins(user_id, amount, reason):
+            return None
+        return await self.economy_api.get_coins(user_id)
 
-        # 在真实场景中，还需要检查ticker是否已存在
-        return ticker
+    async def _generate_stock_ticker(self) -> Optional[str]:
+        """按持久化的递增序号分配一个4位大写字母股票代码，序号用尽时返回 None
 
-    async def company_ipo(self, user_id: str, custom_ticker: str) -> str:
-        """处理公司上市 (IPO) 的逻辑 (V4 - 使用固定费用)"""
+        自动代码与用户自定义代码、旧版随机代码共用同一命名空间，
+        因此仍需确认未被占用；被占用的序号直接跳过，不会在下次重试时再撞上。
+        """
+        if self._ticker_counter is None:
+            seq = await data_manager.get_ticker_seq()
+            if self._ticker_counter is None:
+                self._ticker_counter = seq
+        while self._ticker_counter < _AUTO_TICKER_SPACE:
+            n = self._ticker_counter
+            self._ticker_counter += 1
+            await data_manager.bump_ticker_seq()
+            ticker = _encode_ticker(n)
+            if await self.stock_api.is_ticker_available(ticker):
+                return ticker
+        return None
+
+    async def _rollback_ipo_listing(self, ticker: str):
+        """撤销已在股票市场注册的上市，撤销失败时记录日志以便人工处理"""
+        if not await self.stock_api.delist_stock(ticker):
+            logger.error(f"上市失败后撤销股票 {ticker} 的注册未成功，请手动处理")
+        self._invalidate_quote(ticker)
+
+    async def company_ipo(self, user_id: str, custom_ticker: str = "") -> str:
+        """处理公司上市 (IPO) 的逻辑 (V4 - 使用固定费用)，未指定代码时自动分配"""
         if not self.economy_api:
             return "错误：经济系统不可用。"
         if not self.stock_api:
@@ -95,19 +351,14 @@ class CompanyService:
         if company.get("is_public"):
             return "您的公司已经是上市公司了。"
 
-        import re
+        if custom_ticker:
+            is_valid, ticker = _validate_ticker(custom_ticker)
+            if not is_valid:
+                return ticker
 
-        processed_ticker = custom_ticker.upper()
-        if not (
-            2 <= len(processed_ticker) <= 5 and re.match("^[A-Z]+$", processed_ticker)
-        ):
-            return f"❌ 无效的股票代码「{custom_ticker}」。代码必须是2到5位纯英文字母。"
-
-        is_available = await self.stock_api.is_ticker_available(processed_ticker)
-        if not is_available:
-            return f"❌ 股票代码「{processed_ticker}」已被占用，请换一个。"
-
-        ticker = processed_ticker
+            is_available = await self.stock_api.is_ticker_available(ticker)
+            if not is_available:
+                return f"❌ 股票代码「{ticker}」已被占用，请换一个。"
 
         listing_fee = config.IPO_LISTING_FEE
         capital_injection = config.IPO_CAPITAL_INJECTION
@@ -116,10 +367,13 @@ class CompanyService:
         if user_coins < listing_fee:
             return f"启动资金不足！上市需要手续费 {listing_fee:,.0f} 金币。"
 
-        await self.economy_api.add_coins(user_id, -listing_fee, "公司上市手续费")
+        # 所有前置检查通过后才分配自动代码，避免失败的尝试白白消耗序号
+        if not custom_ticker:
+            ticker = await self._generate_stock_ticker()
+            if ticker is None:
+                return "❌ 自动分配的股票代码已用尽，请指定一个自定义股票代码。"
 
-        level_info = config.COMPANY_LEVELS.get(company["level"])
-        current_assets = level_info["assets"]
+        current_assets = config.LEVEL_ASSETS[company["level"]]
         initial_price = round(current_assets / config.IPO_TOTAL_SHARES, 2)
 
         register_success = await self.stock_api.register_stock(
@@ -131,10 +385,22 @@ class CompanyService:
         )
 
         if not register_success:
-            await self.economy_api.add_coins(
-                user_id, listing_fee, "上市失败，手续费返还"
-            )
-            return "向股票市场注册时发生未知错误，请联系管理员。费用已退还。"
+            return "向股票市场注册时发生未知错误，请联系管理员。您的资金未被扣除。"
+
+        # 注册成功后才收取手续费，注册失败时无需再退款；
+        # 扣费失败或期间余额被其他操作花掉时撤销注册并退回已扣的费用
+        balance_after_fee = await self._add_and_get(
+            user_id, -listing_fee, "公司上市手续费"
+        )
+        if balance_after_fee is None or balance_after_fee < 0:
+            if balance_after_fee is not None:
+                await self.economy_api.add_coins(
+                    user_id, listing_fee, "公司上市失败退款"
+                )
+            await self._rollback_ipo_listing(ticker)
+            if balance_after_fee is None:
+                return "扣除上市手续费失败，上市已取消，请稍后再试。"
+            return f"启动资金不足！上市需要手续费 {listing_fee:,.0f} 金币。"
 
         now = int(time.time())
         updates = {
@@ -144,18 +410,30 @@ class CompanyService:
             "last_earnings_report_time": now,
             "last_income_claim_time": now,
         }
-        await data_manager.update_company(user_id, updates)
-
-        await self.economy_api.add_coins(user_id, capital_injection, "公司上市融资")
+        if not await data_manager.update_company(user_id, updates):
+            await asyncio.gather(
+                self.economy_api.add_coins(user_id, listing_fee, "公司上市失败退款"),
+                self._rollback_ipo_listing(ticker),
+            )
+            return "公司上市失败，发生了一个内部错误，手续费已退回。"
 
-        new_balance = await self.economy_api.get_coins(user_id)
+        new_balance = await self._add_and_get(
+            user_id, capital_injection, "公司上市融资"
+        )
+        if new_balance is None:
+            logger.error(
+                f"用户 {user_id} 的公司上市融资款 {capital_injection} 入账失败"
+            )
+            balance_line = "当前余额: 融资款入账失败，请联系管理员\n"
+        else:
+            balance_line = f"当前余额: {new_balance:,.0f} 金币\n"
         return (
             f"🎉 恭喜！您的公司「{company['name']}」已成功上市！\n"
             f"--------------------\n"
             f"股票代码: {ticker}\n"
             f"发行价格: {initial_price:,.2f} 金币/股\n"
             f"融资净额: +{capital_injection:,.0f} 金币\n"
-            f"当前余额: {new_balance:,.0f} 金币\n"
+            f"{balance_line}"
             f"--------------------\n"
             f"您的公司已进入新的发展阶段！请使用 `/公司财报` 周期性地获取分红。"
         )
@@ -176,9 +454,7 @@ class CompanyService:
             remaining_time = (
                 config.CORPORATE_ACTION_COOLDOWN_SECONDS - time_since_last_action
             )
-            hours, rem = divmod(remaining_time, 3600)
-            minutes, _ = divmod(rem, 60)
-            return f"决策过密！距离下一次可执行公司行动还需：{int(hours)}小时 {int(minutes)}分钟。"
+            return f"决策过密！距离下一次可执行公司行动还需：{_format_hm(remaining_time)}。"
 
         # 2. 验证行动类型并获取配置
         action_config = config.CORPORATE_ACTIONS.get(action_keyword)
@@ -186,7 +462,7 @@ class CompanyService:
             return f"未知的公司行动「{action_keyword}」。"
 
         # 3. 计算成本
-        price = await self.stock_api.get_stock_price(company["stock_ticker"])
+        price = await self._get_price(company["stock_ticker"])
         if price is None:
             return "错误：无法获取公司市值，请稍后再试。"
 
@@ -198,12 +474,14 @@ class CompanyService:
             return f"资金不足！执行「{action_config['name']}」需要 {cost:,.0f} 金币。"
 
         # 4. 执行操作：扣款、添加效果、更新冷却
-        await self.economy_api.add_coins(
+        new_balance = await self._add_and_get(
             user_id, -cost, f"公司行动: {action_config['name']}"
         )
+        if new_balance is None:
+            return "扣除公司行动费用失败，请稍后再试。"
 
         bonus_min, bonus_max = action_config["earnings_bonus_range"]
-        bonus_potency = round(random.uniform(bonus_min, bonus_max), 3)
+        bonus_potency = random.uniform(bonus_min, bonus_max)
 
         # 添加一个一次性的、将在财报结算时消耗的效果
         await data_manager.add_effect(
@@ -213,11 +491,11 @@ class CompanyService:
             duration_seconds=config.EARNINGS_REPORT_CYCLE_SECONDS
             + 3600,  # 确保比财报周期长
             is_consumed_on_use=True,
+            source_action=action_keyword,
         )
 
         await data_manager.update_company(user_id, {"last_corporate_action_time": now})
 
-        new_balance = await self.economy_api.get_coins(user_id)
         return (
             f"📈 决策已执行！\n"
             f"--------------------\n"
@@ -243,39 +521,44 @@ class CompanyService:
             remaining_time = (
                 config.EARNINGS_REPORT_CYCLE_SECONDS - time_since_last_report
             )
-            hours, rem = divmod(remaining_time, 3600)
-            minutes, _ = divmod(rem, 60)
-            return f"距离下一次可发布财报还需：{int(hours)}小时 {int(minutes)}分钟。"
+            return f"距离下一次可发布财报还需：{_format_hm(remaining_time)}。"
 
-        # 财报加成逻辑         action_bonuses = await data_manager.get_active_effects(user_id, 'earnings_modifier')
+        # 财报加成与股价互不依赖，并发查询
+        ticker = company["stock_ticker"]
+        action_bonuses, current_price = await asyncio.gather(
+            data_manager.get_active_effects(user_id, "earnings_modifier"),
+            self._get_price(ticker),
+        )
+        if current_price is None:
+            return f"错误：无法获取公司 {ticker} 的当前股价，请稍后再试。"
+
+        # 先记录本次财报时间，写库失败时直接中止，避免同一周期重复发放分红
+        if not await data_manager.update_company(
+            user_id, {"last_earnings_report_time": now}
+        ):
+            return "发布财报失败，发生了一个内部错误，请稍后再试。"
+
+        # 财报加成逻辑
         total_bonus_modifier = 1.0
         bonus_messages = []
         if action_bonuses:
             for effect in action_bonuses:
                 total_bonus_modifier *= effect["potency"]
-                for action in config.CORPORATE_ACTIONS.values():
-                    if (
-                        action["earnings_bonus_range"][0]
-                        <= effect["potency"]
-                        <= action["earnings_bonus_range"][1]
-                    ):
-                        bonus_messages.append(
-                            f"「{action['name']}」投资生效 (+{(effect['potency'] - 1):.1%})"
-                        )
-                        break
-                await data_manager.consume_effect(effect["effect_id"])
+                action_name = _corporate_action_name(effect)
+                if action_name:
+                    bonus_messages.append(
+                        f"「{action_name}」投资生效 (+{(effect['potency'] - 1):.1%})"
+                    )
+            await asyncio.gather(
+                *(data_manager.consume_effect(e["effect_id"]) for e in action_bonuses)
+            )
 
         # 步骤A: 计算“等级基础分红”
-        level_info = config.COMPANY_LEVELS.get(company["level"])
-        base_income_per_hour = level_info["income_per_hour"]
+        base_income_per_hour = config.LEVEL_INCOME_PER_HOUR[company["level"]]
         cycle_hours = config.EARNINGS_REPORT_CYCLE_SECONDS / 3600
         level_based_dividend = base_income_per_hour * cycle_hours
 
         # 步骤B: 计算“市值绩效分红”
-        ticker = company["stock_ticker"]
-        current_price = await self.stock_api.get_stock_price(ticker)
-        if current_price is None:
-            return f"错误：无法获取公司 {ticker} 的当前股价，请稍后再试。"
         market_cap = current_price * company["total_shares"]
         market_cap_based_dividend = market_cap * config.DIVIDEND_YIELD_RATE
 
@@ -285,20 +568,23 @@ class CompanyService:
         )
 
         # 1. 计算最终业绩 (后续逻辑不变)
-        performance_modifier = round(
-            random.uniform(*config.EARNINGS_PERFORMANCE_RANGE), 3
-        )
+        performance_modifier = random.uniform(*config.EARNINGS_PERFORMANCE_RANGE)
         final_modifier = performance_modifier * total_bonus_modifier
         final_dividend = int(base_dividend * final_modifier)
 
-        # 2. 发放分红 & 更新时间戳
-        await self.economy_api.add_coins(
-            user_id, final_dividend, f"{company['name']} 混合财报分红"
+        # 2. 发放分红、影响股价，两者互不依赖，并发执行
+        new_balance, _ = await asyncio.gather(
+            self._add_and_get(
+                user_id, final_dividend, f"{company['name']} 混合财报分红"
+            ),
+            self.stock_api.report_earnings(ticker, final_modifier),
         )
-        await data_manager.update_company(user_id, {"last_earnings_report_time": now})
-
-        # 3. 影响股价
-        await self.stock_api.report_earnings(company["stock_ticker"], final_modifier)
+        self._invalidate_quote(ticker)
+        if new_balance is None:
+            logger.error(f"用户 {user_id} 的财报分红 {final_dividend} 入账失败")
+            balance_line = "当前余额: 分红入账失败，请联系管理员"
+        else:
+            balance_line = f"当前余额: {new_balance:,.0f} 金币"
 
         # 4. 构建消息
         if final_modifier > 1.1:
@@ -310,89 +596,43 @@ class CompanyService:
         else:
             report_text = "业绩表现平平"
 
-        new_balance = await self.economy_api.get_coins(user_id)
-
-        final_message = (
-            f"📊「{company['name']}」季度财报发布！\n"
-            f"--------------------\n"
-            f"当前公司市值: {market_cap:,.0f} 金币\n"
-            f"业绩评价: 【{report_text}】 (总修正: {final_modifier:.2f})\n"
-        )
-        if bonus_messages:
-            final_message += "\n".join(bonus_messages) + "\n"
-
-        final_message += (
-            f"董事长分红: {final_dividend:,.0f} 金币\n"
-            f"(分红构成: {config.LEVEL_DIVIDEND_WEIGHT:.0%}来自等级基础, {config.MARKET_CAP_DIVIDEND_WEIGHT:.0%}来自市值表现)\n"
-            f"当前余额: {new_balance:,.0f} 金币\n"
-            f"--------------------\n"
-            f"本次财报已影响公司股价，请前往市场查看。"
-        )
-        return final_message
+        lines = [
+            f"📊「{company['name']}」季度财报发布！",
+            "--------------------",
+            f"当前公司市值: {market_cap:,.0f} 金币",
+            f"业绩评价: 【{report_text}】 (总修正: {final_modifier:.2f})",
+        ]
+        lines.extend(bonus_messages)
+        lines += [
+            f"董事长分红: {final_dividend:,.0f} 金币",
+            f"(分红构成: {config.LEVEL_DIVIDEND_WEIGHT:.0%}来自等级基础, {config.MARKET_CAP_DIVIDEND_WEIGHT:.0%}来自市值表现)",
+            balance_line,
+            "--------------------",
+            "本次财报已影响公司股价，请前往市场查看。",
+        ]
+        return "\n".join(lines)
 
+    @staticmethod
     def _get_current_bonuses(
-        self, company_data: Dict, active_effects: List[Dict]
+        company_data: Dict, effects_by_type: Dict[str, List[Dict]]
     ) -> Dict:
-        """根据公司数据和活动效果，计算并返回最终的各项加成系数 (已支持PR类buff)"""
-        bonuses = {"operations": 1.0, "research": 1.0, "pr": 1.0}
-        if not company_data:
-            return bonuses
-
-        ops_level = company_data.get("dept_ops_level", 0)
-        res_level = company_data.get("dept_res_level", 0)
-        pr_level = company_data.get("dept_pr_level", 0)
-
-        if ops_level > 0:
-            bonuses["operations"] = config.DEPARTMENT_LEVELS[ops_level][
-                "operations_bonus"
-            ]
-        if res_level > 0:
-            bonuses["research"] = config.DEPARTMENT_LEVELS[res_level]["research_bonus"]
-        if pr_level > 0:
-            bonuses["pr"] = config.DEPARTMENT_LEVELS[pr_level]["pr_bonus"]
-
-        # 疊加所有有时效性的效果
-        for effect in active_effects:
-            if effect["effect_type"] == "income_modifier":
-                bonuses["operations"] *= effect["potency"]
-            # +++ 新增：处理PR加成效果 +++
-            elif effect["effect_type"] == "pr_modifier":
-                bonuses["pr"] *= effect["potency"]
-
-        return bonuses
-
-    async def _apply_cost_modifiers(
-        self, user_id: str, initial_cost: float
-    ) -> (float, bool):
         """
-        检查并应用所有一次性的成本修正效果(如技术封锁)。
-        Args:
-            user_id: 用户的ID。
-            initial_cost: 未应用debuff前的原始成本。
-        Returns:
-            A tuple containing:
-                - final_cost (float): 应用debuff后的最终成本。
-                - applied (bool): 是否成功应用了至少一个debuff。
+        根据公司数据和按类型分组的活动效果，计算并返回最终的各项加成系数 (已支持PR类buff)。
+        纯函数：只做查表与少量乘法，每次请求对同一公司最多调用一次，无需缓存。
         """
-        final_cost = initial_cost
-        cost_penalty_applied = False
-
-        # 只获取那些需要在使用后被消耗的效果
-        cost_effects = await data_manager.get_active_effects(user_id, "cost_modifier")
-        effects_to_consume = [
-            eff for eff in cost_effects if eff.get("is_consumed_on_use")
-        ]
-
-        if effects_to_consume:
-            for effect in effects_to_consume:
-                final_cost = round(final_cost * effect["potency"])
-                await data_manager.consume_effect(effect["effect_id"])
-                logger.info(
-                    f"已为用户 {user_id} 消耗debuff effect_id: {effect['effect_id']}，成本从 {initial_cost} 变为 {final_cost}"
-                )
-            cost_penalty_applied = True
-
-        return final_cost, cost_penalty_applied
+        if not company_data:
+            return {"operations": 1.0, "research": 1.0, "pr": 1.0}
+
+        # 部门基础加成 (0级部门在表中为1.0) 乘以对应类型所有时效性效果的系数
+        income_effects = effects_by_type.get("income_modifier", ())
+        pr_effects = effects_by_type.get("pr_modifier", ())
+        return {
+            "operations": config.DEPT_OPS_BONUS[company_data.get("dept_ops_level", 0)]
+            * math.prod(e["potency"] for e in income_effects),
+            "research": config.DEPT_RES_BONUS[company_data.get("dept_res_level", 0)],
+            "pr": config.DEPT_PR_BONUS[company_data.get("dept_pr_level", 0)]
+            * math.prod(e["potency"] for e in pr_effects),
+        }
 
     async def company_delist(self, user_id: str) -> str:
         """处理公司退市（私有化）的逻辑"""
@@ -405,7 +645,7 @@ class CompanyService:
 
         ticker = company["stock_ticker"]
         # +++ 核心修改：调用新的API获取市值 +++
-        market_cap = await self.stock_api.get_market_cap(ticker)
+        market_cap = await self._get_market_cap(ticker)
         if market_cap is None:
             return "错误：无法获取您公司的当前市值，请稍后再试。"
         # +++ 修改结束 +++
@@ -420,23 +660,28 @@ class CompanyService:
                 f"您当前的资金不足。"
             )
 
-        # 2. 调用股票插件API，执行退市操作
-        delist_success = await self.stock_api.delist_stock(ticker)
-        if not delist_success:
-            return (
-                "错误：股票市场服务未能成功处理退市请求，操作已取消，您的资金未被扣除。"
-            )
-
-        # 3. 扣除费用
-        await self.economy_api.add_coins(
+        # 2. 先扣除费用，扣费失败时直接中止，股票仍保持上市
+        new_balance = await self._add_and_get(
             user_id, -delist_cost, f"公司 {company['name']} 私有化退市"
         )
+        if new_balance is None:
+            return "扣除退市费用失败，操作已取消，请稍后再试。"
+
+        # 3. 调用股票插件API，执行退市操作，失败时退回费用
+        delist_success = await self.stock_api.delist_stock(ticker)
+        self._invalidate_quote(ticker)
+        if not delist_success:
+            await self.economy_api.add_coins(user_id, delist_cost, "公司退市失败退款")
+            return "错误：股票市场服务未能成功处理退市请求，操作已取消，费用已退回。"
 
         # 4. 更新公司数据库状态，恢复为私有
         updates = {"is_public": 0, "stock_ticker": None, "total_shares": 0}
-        await data_manager.update_company(user_id, updates)
+        if not await data_manager.update_company(user_id, updates):
+            logger.critical(
+                f"用户 {user_id} 的股票 {ticker} 已退市并扣费，但公司状态未能更新为私有！请手动检查数据库！"
+            )
+            return "股票已退市，但更新公司状态时发生了一个严重错误。请立即联系管理员检查您的公司状态。"
 
-        new_balance = await self.economy_api.get_coins(user_id)
         return (
             f"✅ 私有化成功！\n"
             f"--------------------\n"
@@ -459,12 +704,6 @@ class CompanyService:
         if user_coins < config.FOUNDATION_COST:
             return f"启动资金不足！创建公司需要 {config.FOUNDATION_COST:,.0f} 金币，您当前只有 {user_coins:,.0f} 金币。"
 
-        success = await self.economy_api.add_coins(
-            user_id, -config.FOUNDATION_COST, "创建公司启动资金"
-        )
-        if not success:
-            return "扣除启动资金失败，请稍后再试。"
-
         now = int(time.time())
         new_company = {
             "name": company_name,
@@ -472,19 +711,23 @@ class CompanyService:
             "last_income_claim_time": now,
         }
 
-        if await data_manager.create_company(user_id, new_company):
-            new_balance = await self.economy_api.get_coins(user_id)
-            return (
-                f"恭喜！您的公司「{company_name}」已成功创立！\n"
-                f"--------------------\n"
-                f"💵 启动资金: -{config.FOUNDATION_COST:,.0f} 金币\n"
-                f"💰 当前余额: {new_balance:,.0f} 金币"
-            )
-        else:
-            await self.economy_api.add_coins(
-                user_id, config.FOUNDATION_COST, "创建公司失败，资金返还"
-            )
-            return "创建公司失败，发生了一个内部错误，您的资金已退回。"
+        # 先建档，成功后再扣除启动资金，建档失败时无需退款
+        if not await data_manager.create_company(user_id, new_company):
+            return "创建公司失败，发生了一个内部错误，您的资金未被扣除。"
+
+        new_balance = await self._add_and_get(
+            user_id, -config.FOUNDATION_COST, "创建公司启动资金"
+        )
+        if new_balance is None:
+            await data_manager.delete_company(user_id)
+            return "扣除启动资金失败，请稍后再试。"
+
+        return (
+            f"恭喜！您的公司「{company_name}」已成功创立！\n"
+            f"--------------------\n"
+            f"💵 启动资金: -{config.FOUNDATION_COST:,.0f} 金币\n"
+            f"💰 当前余额: {new_balance:,.0f} 金币"
+        )
 
     async def dissolve_company(self, user_id: str) -> str:
         """处理出售/解散公司的逻辑"""
@@ -506,7 +749,7 @@ class CompanyService:
                 return "错误：股票市场服务不可用，无法计算上市公司市值。"
 
             ticker = company["stock_ticker"]
-            market_cap = await self.stock_api.get_market_cap(ticker)
+            market_cap = await self._get_market_cap(ticker)
             if market_cap is None:
                 return "错误：无法获取您公司的当前市值，请稍后再试。"
 
@@ -515,35 +758,38 @@ class CompanyService:
 
             # 出售前必须先从市场退市
             delist_success = await self.stock_api.delist_stock(ticker)
+            self._invalidate_quote(ticker)
             if not delist_success:
                 return "错误：从股票市场退市时发生问题，操作已取消。"
 
         else:  # 私有公司
             level = company.get("level", 1)
-            company_value = config.COMPANY_LEVELS.get(level, {}).get("assets", 0)
+            company_value = config.LEVEL_ASSETS[level]
             value_type = "公司资产"
 
         # 3. 计算回收金额 (60%)
         payout_rate = 0.60
         payout_amount = int(company_value * payout_rate)
 
-        # 4. 执行数据库操作
-        await self.economy_api.add_coins(
-            user_id, payout_amount, f"出售公司「{company_name}」"
+        # 4. 执行数据库操作：发放回收资金，同时删除公司数据及其所有相关效果
+        new_balance, delete_ok = await asyncio.gather(
+            self._add_and_get(user_id, payout_amount, f"出售公司「{company_name}」"),
+            data_manager.delete_company_and_effects(user_id),
         )
 
-        # 删除公司数据及其所有相关效果
-        delete_company_ok = await data_manager.delete_company(user_id)
-        delete_effects_ok = await data_manager.delete_all_effects_for_user(user_id)
-
-        if not (delete_company_ok and delete_effects_ok):
+        if not delete_ok:
             logger.critical(
                 f"为用户 {user_id} 清理公司数据时出错，但资金可能已发放！请手动检查数据库！"
             )
             return "公司数据清理时发生了一个严重错误，但资金已结算。请立即联系管理员检查您的账户状态。"
 
+        if new_balance is None:
+            logger.critical(
+                f"用户 {user_id} 的公司「{company_name}」已出售，但回收资金 {payout_amount} 未能发放！"
+            )
+            return "公司已出售，但回收资金发放失败。请立即联系管理员为您补发。"
+
         # 5. 构建成功消息
-        new_balance = await self.economy_api.get_coins(user_id)
         return (
             f"✅ 公司已成功出售！\n"
             f"--------------------\n"
@@ -587,10 +833,9 @@ class CompanyService:
         if level >= config.MAX_LEVEL:
             return "您的公司已经达到最高等级！"
 
-        await data_manager.clear_expired_effects(user_id)
-        bonuses = self._get_current_bonuses(company, [])
+        bonuses = self._get_current_bonuses(company, {})
         research_discount = bonuses["research"]
-        base_upgrade_cost = config.COMPANY_LEVELS[level]["upgrade_cost"]
+        base_upgrade_cost = config.LEVEL_UPGRADE_COST[level]
         cost_after_discount = round(base_upgrade_cost * research_discount)
         final_cost, effects_to_consume = await self._apply_cost_modifiers(
             user_id, cost_after_discount
@@ -610,14 +855,16 @@ class CompanyService:
             return "扣除升级费用失败，请稍后再试。"
 
         if cost_penalty_applied:
-            for effect in effects_to_consume:
-                await data_manager.consume_effect(effect["effect_id"])
+            await asyncio.gather(
+                *(
+                    data_manager.consume_effect(e["effect_id"])
+                    for e in effects_to_consume
+                )
+            )
 
         announcement_period_seconds = 30
-        asyncio.create_task(
-            self._finalize_public_company_upgrade(
-                user_id, level, announcement_period_seconds
-            )
+        self._schedule_public_company_upgrade(
+            user_id, level, announcement_period_seconds
         )
 
         hours = announcement_period_seconds / 3600
@@ -638,27 +885,83 @@ class CompanyService:
 
         announcement_message = f"【市场公告】\n📈 {company['name']}({company['stock_ticker']}) 宣布启动重大扩张计划，预计将在 {int(hours) if hours >= 1 else announcement_period_seconds} {'小时' if hours >= 1 else '秒'}后完成升级。请投资者关注后续市场变化。"
 
-        for group_id in config.BROADCAST_GROUP_IDS:
-            try:
-                # 直接使用 "Napcat" 构建 UMO 字符串
-                umo_string = f"Napcat:GroupMessage:{str(group_id)}"
+        chain = MessageChain().message(announcement_message)
 
-                await self.plugin.context.send_message(
-                    umo_string, MessageChain().message(announcement_message)
-                )
-                logger.info(f"已向群 {group_id} (UMO: {umo_string}) 成功广播市场公告。")
-            except Exception as e:
-                logger.error(f"向群 {group_id} 广播市场公告失败: {e}", exc_info=True)
+        # 广播在后台并发进行，用户无需等待所有群消息发送完毕
+        task = asyncio.create_task(self._broadcast_to_groups(chain))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
         return user_message
 
-    # +++ 3. 后台执行升级的最终步骤 +++
-    async def _finalize_public_company_upgrade(
+    async def _broadcast_to_groups(self, chain):
+        """向所有配置的广播群并发发送同一条消息"""
+        await asyncio.gather(
+            *(self._safe_send(umo, chain) for umo in config.BROADCAST_UMO_STRINGS)
+        )
+
+    async def _safe_send(self, umo: str, chain):
+        """向单个群发送消息，失败时仅记录日志，不影响其他群的广播"""
+        try:
+            await self.plugin.context.send_message(umo, chain)
+            logger.info(f"已向 {umo} 成功广播市场公告。")
+        except Exception as e:
+            logger.error(f"向 {umo} 广播市场公告失败: {e}", exc_info=True)
+
+    def _schedule_public_company_upgrade(
         self, user_id: str, original_level: int, delay_seconds: int
     ):
-        """在延迟后最终完成上市公司升级的后台任务"""
-        await asyncio.sleep(delay_seconds)
+        """登记一个待完成的上市公司升级，并唤醒调度任务重新计算最近的到期时间"""
+        heapq.heappush(
+            self._upgrade_heap, (time.time() + delay_seconds, user_id, original_level)
+        )
+        if self._upgrade_scheduler_task is None or self._upgrade_scheduler_task.done():
+            self._upgrade_scheduler_task = asyncio.create_task(
+                self._upgrade_scheduler()
+            )
+        self._upgrade_wakeup.set()
+
+    async def _upgrade_scheduler(self):
+        """单个后台任务：睡眠到最近的到期时间，处理所有已到期的升级，然后继续等待"""
+        heap = self._upgrade_heap
+        while True:
+            if not heap:
+                await self._upgrade_wakeup.wait()
+                self._upgrade_wakeup.clear()
+                continue
+
+            timeout = heap[0][0] - time.time()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._upgrade_wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                # 被新登记的升级唤醒时，重新检查堆顶
+                self._upgrade_wakeup.clear()
+
+            now = time.time()
+            while heap and heap[0][0] <= now:
+                _, user_id, original_level = heapq.heappop(heap)
+                try:
+                    await self._finalize_public_company_upgrade(user_id, original_level)
+                except Exception as e:
+                    logger.error(
+                        f"完成用户 {user_id} 的上市公司升级时出错: {e}", exc_info=True
+                    )
+
+    async def shutdown(self):
+        """取消后台调度任务，在插件卸载时调用"""
+        task = self._upgrade_scheduler_task
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
+    # +++ 3. 后台执行升级的最终步骤 +++
+    async def _finalize_public_company_upgrade(self, user_id: str, original_level: int):
+        """公示期结束后最终完成上市公司升级"""
         company = await data_manager.get_company(user_id)
         if (
             not company
@@ -671,7 +974,7 @@ class CompanyService:
         new_level = original_level + 1
         await data_manager.update_company(user_id, {"level": new_level})
 
-        new_level_assets = config.COMPANY_LEVELS[new_level].get("assets", 0)
+        new_level_assets = config.LEVEL_ASSETS[new_level]
         new_intrinsic_value_per_share = round(
             new_level_assets / company["total_shares"], 2
         )
@@ -681,6 +984,7 @@ class CompanyService:
                 await self.stock_api.set_intrinsic_value(
                     company["stock_ticker"], new_intrinsic_value_per_share
                 )
+                self._invalidate_quote(company["stock_ticker"])
                 logger.info(
                     f"用户 {user_id} 的公司已成功升级至 Lv.{new_level}，新的内在价值 {new_intrinsic_value_per_share} 已同步至股票市场。"
                 )
@@ -704,20 +1008,19 @@ class CompanyService:
         if level >= config.MAX_LEVEL:
             return "您的公司已经达到最高等级，无需再升级了！"
 
-        await data_manager.clear_expired_effects(user_id)
-        income_effects = await data_manager.get_active_effects(
-            user_id, "income_modifier"
+        effects_by_type = await data_manager.get_active_effects_multi(
+            user_id, ["income_modifier", "cost_modifier"]
         )
 
-        bonuses = self._get_current_bonuses(company, income_effects)
+        bonuses = self._get_current_bonuses(company, effects_by_type)
         research_discount = bonuses["research"]
 
-        base_upgrade_cost = config.COMPANY_LEVELS[level]["upgrade_cost"]
+        base_upgrade_cost = config.LEVEL_UPGRADE_COST[level]
 
         cost_after_discount = round(base_upgrade_cost * research_discount)
 
         final_cost, effects_to_consume = await self._apply_cost_modifiers(
-            user_id, cost_after_discount
+            user_id, cost_after_discount, effects_by_type["cost_modifier"]
         )
         cost_penalty_applied = bool(effects_to_consume)
 
@@ -725,36 +1028,37 @@ class CompanyService:
         if user_coins < final_cost:
             return f"资金不足！公司升至 {level + 1} 级需要 {final_cost:,.0f} 金币，您当前只有 {user_coins:,.0f} 金币。"
 
-        success = await self.economy_api.add_coins(
+        # 先写入新等级，成功后再扣费并消耗效果，写库失败时无需退款
+        if not await data_manager.update_company(user_id, {"level": level + 1}):
+            return "公司升级失败，发生了一个内部错误，您的资金未被扣除。"
+
+        new_balance = await self._add_and_get(
             user_id, -final_cost, f"公司从Lv.{level}升至Lv.{level + 1}"
         )
-        if not success:
+        if new_balance is None:
+            await data_manager.update_company(user_id, {"level": level})
             return "扣除升级费用失败，请稍后再试。"
 
         if cost_penalty_applied:
-            for effect in effects_to_consume:
-                await data_manager.consume_effect(effect["effect_id"])
-
-        if await data_manager.update_company(user_id, {"level": level + 1}):
-            new_balance = await self.economy_api.get_coins(user_id)
-
-            final_message = (
-                f"🎉 升级成功！您的公司已提升至 Lv.{level + 1}！\n"
-                f"--------------------\n"
-                f"💵 升级费用: -{final_cost:,.0f} 金币\n"
-                f"💰 当前余额: {new_balance:,.0f} 金币"
-            )
-            if cost_penalty_applied:
-                final_message += (
-                    "\n\n⚠️ 安全警报：由于之前的商业刺探，本次升级消耗了额外的资金！"
+            await asyncio.gather(
+                *(
+                    data_manager.consume_effect(e["effect_id"])
+                    for e in effects_to_consume
                 )
+            )
 
-            return final_message
-        else:
-            await self.economy_api.add_coins(
-                user_id, final_cost, "公司升级失败，资金返还"
+        final_message = (
+            f"🎉 升级成功！您的公司已提升至 Lv.{level + 1}！\n"
+            f"--------------------\n"
+            f"💵 升级费用: -{final_cost:,.0f} 金币\n"
+            f"💰 当前余额: {new_balance:,.0f} 金币"
+        )
+        if cost_penalty_applied:
+            final_message += (
+                "\n\n⚠️ 安全警报：由于之前的商业刺探，本次升级消耗了额外的资金！"
             )
-            return "公司升级失败，发生了一个内部错误，您的资金已退回。"
+
+        return final_message
 
     async def rename_company(self, user_id: str, new_name: str) -> str:
         """处理公司改名的逻辑 (已修复debuff消耗漏洞)"""
@@ -767,16 +1071,15 @@ class CompanyService:
         if company["name"] == new_name:
             return f"您的公司名已经是「{new_name}」了，无需更改。"
 
-        await data_manager.clear_expired_effects(user_id)
-        income_effects = await data_manager.get_active_effects(
-            user_id, "income_modifier"
+        effects_by_type = await data_manager.get_active_effects_multi(
+            user_id, ["income_modifier", "cost_modifier"]
         )
-        bonuses = self._get_current_bonuses(company, income_effects)
+        bonuses = self._get_current_bonuses(company, effects_by_type)
 
         base_cost = round(config.COMPANY_RENAME_COST * bonuses["research"])
 
         final_cost, effects_to_consume = await self._apply_cost_modifiers(
-            user_id, base_cost
+            user_id, base_cost, effects_by_type["cost_modifier"]
         )
         cost_penalty_applied = bool(effects_to_consume)
 
@@ -784,34 +1087,44 @@ class CompanyService:
         if user_coins < final_cost:
             return f"金币不足！公司改名需要 {final_cost:,.0f} 金币 (已计算折扣与附加费用)，您当前只有 {user_coins:,.0f} 金币。"
 
-        success = await self.economy_api.add_coins(user_id, -final_cost, "公司改名费用")
-        if not success:
+        # 先写入新名称，成功后再扣费并消耗效果，写库失败时无需退款
+        if not await data_manager.update_company(user_id, {"name": new_name}):
+            return "公司改名失败，发生了一个内部错误，您的资金未被扣除。"
+
+        new_balance = await self._add_and_get(user_id, -final_cost, "公司改名费用")
+        if new_balance is None:
+            await data_manager.update_company(user_id, {"name": company["name"]})
             return "扣除改名费用失败，请稍后再试。"
 
         if cost_penalty_applied:
-            for effect in effects_to_consume:
-                await data_manager.consume_effect(effect["effect_id"])
-
-        if await data_manager.update_company(user_id, {"name": new_name}):
-            new_balance = await self.economy_api.get_coins(user_id)
-            final_message = (
-                f"✅ 公司改名成功！\n"
-                f"--------------------\n"
-                f"旧公司名: 「{company['name']}」\n"
-                f"新公司名: 「{new_name}」\n"
-                f"💵 改名费用: -{final_cost:,.0f} 金币\n"
-                f"💰 当前余额: {new_balance:,.0f} 金币"
-            )
-            if cost_penalty_applied:
-                final_message += (
-                    "\n\n⚠️ 安全警报：由于之前的商业刺探，本次改名消耗了额外的资金！"
+            await asyncio.gather(
+                *(
+                    data_manager.consume_effect(e["effect_id"])
+                    for e in effects_to_consume
                 )
-            return final_message
-        else:
-            await self.economy_api.add_coins(
-                user_id, final_cost, "公司改名失败，资金返还"
             )
-            return "公司改名失败，发生了一个内部错误，您的资金已退回。"
+
+        final_message = (
+            f"✅ 公司改名成功！\n"
+            f"--------------------\n"
+            f"旧公司名: 「{company['name']}」\n"
+            f"新公司名: 「{new_name}」\n"
+            f"💵 改名费用: -{final_cost:,.0f} 金币\n"
+            f"💰 当前余额: {new_balance:,.0f} 金币"
+        )
+        if cost_penalty_applied:
+            final_message += (
+                "\n\n⚠️ 安全警报：由于之前的商业刺探，本次改名消耗了额外的资金！"
+            )
+        return final_message
+
+    @staticmethod
+    async def _load_company_with_effects(user_id: str, effect_types: List[str]):
+        """并发读取一方的公司数据与按类型分组的活动效果"""
+        return await asyncio.gather(
+            data_manager.get_company(user_id),
+            data_manager.get_active_effects_multi(user_id, effect_types),
+        )
 
     async def talent_poach(self, attacker_id: str, target_id: str) -> str:
         """处理人才挖角的逻辑 (V3 - 区分上市公司)"""
@@ -820,8 +1133,15 @@ class CompanyService:
         if not self.economy_api:
             return "错误：经济系统不可用。"
 
-        attacker_company = await data_manager.get_company(attacker_id)
-        target_company = await data_manager.get_company(target_id)
+        # 双方的公司数据与效果互不依赖，一次并发读取
+        bonus_types = ["income_modifier", "pr_modifier"]
+        (
+            (attacker_company, attacker_by_type),
+            (target_company, target_by_type),
+        ) = await asyncio.gather(
+            self._load_company_with_effects(attacker_id, bonus_types),
+            self._load_company_with_effects(target_id, bonus_types),
+        )
 
         if not attacker_company:
             return "您还没有公司，无法发起商业行动。"
@@ -831,30 +1151,10 @@ class CompanyService:
             return f"您的公司需要达到 Lv.{config.DEPARTMENT_UNLOCK_LEVEL} 才能发起商业行动。"
 
         # --- 成本计算 ---
-        await data_manager.clear_expired_effects(attacker_id)
-        attacker_income_effects = await data_manager.get_active_effects(
-            attacker_id, "income_modifier"
-        )
-        attacker_pr_effects = await data_manager.get_active_effects(
-            attacker_id, "pr_modifier"
-        )
-        attacker_effects = attacker_income_effects + attacker_pr_effects
-
-        await data_manager.clear_expired_effects(target_id)
-        target_income_effects = await data_manager.get_active_effects(
-            target_id, "income_modifier"
-        )
-        target_pr_effects = await data_manager.get_active_effects(
-            target_id, "pr_modifier"
-        )
-        target_effects = target_income_effects + target_pr_effects
+        attacker_bonuses = self._get_current_bonuses(attacker_company, attacker_by_type)
+        target_bonuses = self._get_current_bonuses(target_company, target_by_type)
 
-        attacker_bonuses = self._get_current_bonuses(attacker_company, attacker_effects)
-        target_bonuses = self._get_current_bonuses(target_company, target_effects)
-
-        target_base_income = config.COMPANY_LEVELS[target_company["level"]][
-            "income_per_hour"
-        ]
+        target_base_income = config.LEVEL_INCOME_PER_HOUR[target_company["level"]]
         target_income_per_hour = target_base_income * target_bonuses["operations"]
 
         cost_hours = random.uniform(*config.TALENT_POACH_COST_HOURS_RANGE)
@@ -883,23 +1183,16 @@ class CompanyService:
 
         if random.random() < success_chance:
             # --- 成功逻辑 ---
-            target_income_effects_check = await data_manager.get_active_effects(
-                target_id, "income_modifier"
-            )
             current_debuff_count = sum(
-                1
-                for eff in target_income_effects_check
-                if eff.get("potency", 1.0) < 1.0
+                1 for eff in target_by_type["income_modifier"] if eff["potency"] < 1.0
             )
 
             if (
                 current_debuff_count >= config.MAX_INCOME_DEBUFFS_ON_TARGET
                 and not target_company.get("is_public")
             ):
-                return (
-                    f"✅ 挖角成功 (成功率: {success_chance:.0%})！\n"
-                    f"但目标公司已是人心惶惶，人才流失严重，你的行动未能造成进一步影响。\n"
-                    f"💵 行动费用: -{final_cost:,.0f} 金币。"
+                return _POACH_SATURATED_TMPL.format(
+                    chance=success_chance, cost=final_cost
                 )
 
             # --- 区分私有和上市公司 ---
@@ -939,11 +1232,12 @@ class CompanyService:
                     origin_user_id=attacker_id,
                     is_consumed_on_use=debuff_config["is_consumed_on_use"],
                 )
-                return (
-                    f"✅ 挖角成功 (成功率: {success_chance:.0%})！\n"
-                    f"目标上市公司的核心团队出现动荡，股价受到冲击，且下次财报业绩将受到 {(debuff_potency - 1):.1%} 的负面影响！\n"
-                    f"同时，在接下来{duration_hours}小时内，您的公司时薪将获得 +{(buff_potency - 1):.0%} 的加成。\n"
-                    f"💵 行动费用: -{final_cost:,.0f} 金币。"
+                return _POACH_PUBLIC_SUCCESS_TMPL.format(
+                    chance=success_chance,
+                    debuff=debuff_potency - 1,
+                    hours=duration_hours,
+                    buff=buff_potency - 1,
+                    cost=final_cost,
                 )
             else:
                 # 对私有公司施加时薪减益
@@ -957,10 +1251,12 @@ class CompanyService:
                     duration_seconds=duration_seconds,
                     origin_user_id=attacker_id,
                 )
-                return (
-                    f"✅ 挖角成功 (成功率: {success_chance:.0%})！\n"
-                    f"在接下来{duration_hours}小时内，您的公司时薪将获得 +{(buff_potency - 1) * 100:.0f}% 的加成，而对方公司将遭受 -{(1 - debuff_potency) * 100:.0f}% 的损失。\n"
-                    f"💵 行动费用: -{final_cost:,.0f} 金币。"
+                return _POACH_PRIVATE_SUCCESS_TMPL.format(
+                    chance=success_chance,
+                    hours=duration_hours,
+                    buff=(buff_potency - 1) * 100,
+                    debuff=(1 - debuff_potency) * 100,
+                    cost=final_cost,
                 )
         else:
             # --- 失败逻辑 ---
@@ -992,7 +1288,6 @@ class CompanyService:
         if company["level"] < config.DEPARTMENT_UNLOCK_LEVEL:
             return f"公司达到 Lv.{config.DEPARTMENT_UNLOCK_LEVEL} 后即可升级部门。"
 
-        await data_manager.clear_expired_effects(user_id)
         active_effects = await data_manager.get_active_effects(
             user_id, "income_modifier"
         )
@@ -1006,7 +1301,9 @@ class CompanyService:
         res_alias = company.get("dept_res_alias") or "研发部"
         pr_alias = company.get("dept_pr_alias") or "公关部"
 
-        bonuses = self._get_current_bonuses(company, active_effects)
+        bonuses = self._get_current_bonuses(
+            company, {"income_modifier": active_effects}
+        )
 
         ops_bonus_str = f"{(bonuses['operations'] - 1) * 100:,.1f}%"
         res_bonus_str = f"{(1 - bonuses['research']) * 100:,.1f}%"
@@ -1042,7 +1339,6 @@ class CompanyService:
         if company["level"] < config.DEPARTMENT_UNLOCK_LEVEL:
             return f"公司需达到 Lv.{config.DEPARTMENT_UNLOCK_LEVEL} 才能升级部门。"
 
-        await data_manager.clear_expired_effects(user_id)
         income_effects = await data_manager.get_active_effects(
             user_id, "income_modifier"
         )
@@ -1055,10 +1351,12 @@ class CompanyService:
         if dept_level >= max_level_allowed:
             return f"请先提升公司主等级至 Lv.{dept_level + 2}，才能继续升级「{dept_name_or_alias}」。"
 
-        bonuses = self._get_current_bonuses(company, income_effects)
+        bonuses = self._get_current_bonuses(
+            company, {"income_modifier": income_effects}
+        )
         research_discount = bonuses["research"]
 
-        next_level_cost = config.DEPARTMENT_LEVELS[dept_level + 1]["cost"]
+        next_level_cost = config.DEPT_UPGRADE_COST[dept_level + 1]
         base_cost = round(next_level_cost * research_discount)
 
         final_cost, effects_to_consume = await self._apply_cost_modifiers(
@@ -1070,31 +1368,29 @@ class CompanyService:
         if user_coins < final_cost:
             return f"金币不足！升级「{dept_name_or_alias}」需要 {final_cost:,.0f} 金币，您当前只有 {user_coins:,.0f} 金币。"
 
-        success = await self.economy_api.add_coins(
+        new_balance = await self._add_and_get(
             user_id, -final_cost, f"升级 {dept_name_or_alias}"
         )
-        if not success:
+        if new_balance is None:
             return "扣款失败，请重试。"
 
-        if cost_penalty_applied:
-            for effect in effects_to_consume:
-                await data_manager.consume_effect(effect["effect_id"])
-
+        # 部门等级与debuff消耗在同一个事务中写入，失败时两者都不生效
         new_level = dept_level + 1
-        if await data_manager.update_company(user_id, {dept_field_name: new_level}):
-            new_balance = await self.economy_api.get_coins(user_id)
-
+        if await data_manager.update_company_and_consume_effects(
+            user_id,
+            {dept_field_name: new_level},
+            [e["effect_id"] for e in effects_to_consume],
+        ):
             effect_str = ""
-            new_level_config = config.DEPARTMENT_LEVELS[new_level]
 
             if dept_field_name == "dept_ops_level":
-                bonus = (new_level_config["operations_bonus"] - 1) * 100
+                bonus = (config.DEPT_OPS_BONUS[new_level] - 1) * 100
                 effect_str = f"📈 最新效果: 时薪提升 {bonus:,.1f}%"
             elif dept_field_name == "dept_res_level":
-                bonus = (1 - new_level_config["research_bonus"]) * 100
+                bonus = (1 - config.DEPT_RES_BONUS[new_level]) * 100
                 effect_str = f"💼 最新效果: 成本降低 {bonus:,.1f}%"
             elif dept_field_name == "dept_pr_level":
-                bonus = (new_level_config["pr_bonus"] - 1) * 100
+                bonus = (config.DEPT_PR_BONUS[new_level] - 1) * 100
                 effect_str = f"🤝 最新效果: 行动成功率 {bonus:,.1f}%"
 
             final_message = (
@@ -1115,33 +1411,41 @@ class CompanyService:
             await self.economy_api.add_coins(user_id, final_cost, "部门升级失败返款")
             return "部门升级失败，资金已退还。"
 
-    async def _handle_random_event(self, user_id: str, company: dict) -> Optional[Dict]:
-        """处理随机事件 (V2 - 兼容私有和上市公司)"""
-        now = int(time.time())
+    async def _handle_random_event(
+        self, user_id: str, company: data_manager.Company, now: Optional[int] = None
+    ) -> Tuple[Optional[Dict], Optional[data_manager.Company]]:
+        """
+        处理随机事件 (V2 - 兼容私有和上市公司)。
+        返回 (事件结果, 事件后的公司数据)，调用方无需再次查询数据库；公司破产时后者为 None。
+        now 为调用方已取得的当前时间戳，省略时在此获取。
+        """
+        if now is None:
+            now = int(time.time())
         last_event_time = company.get("last_event_time", 0)
 
         if now - last_event_time < config.EVENT_COOLDOWN_SECONDS:
-            return None
+            return None, company
         if random.random() > config.EVENT_PROBABILITY:
-            return None
+            return None, company
 
         # --- 核心改造：根据公司类型选择事件池 ---
         is_public = company.get("is_public", False)
-        events = config.PUBLIC_RANDOM_EVENTS if is_public else config.RANDOM_EVENTS
+        events, cum_weights = _PUBLIC_EVENT_POOL if is_public else _PRIVATE_EVENT_POOL
 
-        event_weights = [e.get("weight", 1) for e in events]
-        if not events or not any(w > 0 for w in event_weights):
-            return None
+        if not cum_weights or cum_weights[-1] <= 0:
+            return None, company
 
-        chosen_event = random.choices(events, weights=event_weights, k=1)[0]
+        chosen_event = random.choices(events, cum_weights=cum_weights, k=1)[0]
 
-        event_result = {"new_balance": await self.economy_api.get_coins(user_id)}
+        event_result = {}
+        # 事件冷却时间与事件本身造成的字段变更一并写入
+        updates = {"last_event_time": now}
         value_min, value_max = chosen_event["value_range"]
         effect_type = chosen_event["effect_type"]
 
         if effect_type == "stock_price_change":
             if not self.stock_api:
-                return None  # 股票服务不可用则跳过
+                return None, company  # 股票服务不可用则跳过
             percent_change = round(random.uniform(value_min, value_max), 4)
             await self.stock_api.report_event(company["stock_ticker"], percent_change)
             display_value = abs(percent_change)
@@ -1174,59 +1478,56 @@ class CompanyService:
                 amount = base_value * company["level"] * multiplier
             elif effect_type == "income_multiple":  # 此类型对上市公司无意义
                 if is_public:
-                    return None
-                level_info = config.COMPANY_LEVELS.get(company["level"])
+                    return None, company
                 multiplier = random.randint(int(value_min), int(value_max))
                 final_hours = multiplier
-                amount = level_info["income_per_hour"] * multiplier
+                amount = config.LEVEL_INCOME_PER_HOUR[company["level"]] * multiplier
 
             if chosen_event["type"] == "negative":
                 amount = -amount
 
-            await self.economy_api.add_coins(user_id, amount, "公司随机事件")
-
-            new_balance = await self.economy_api.get_coins(user_id)
+            new_balance = await self._add_and_get(user_id, amount, "公司随机事件")
             display_value = (
                 final_hours if effect_type == "income_multiple" else abs(amount)
             )
-            event_result.update(
-                {
-                    "message": chosen_event["message"].format(value=display_value),
-                    "amount": amount,
-                    "new_balance": new_balance,
-                }
+            event_result["message"] = chosen_event["message"].format(
+                value=display_value
             )
+            if new_balance is None:
+                # 金币结算失败时不展示金币变动，避免误导
+                logger.error(f"用户 {user_id} 的随机事件金币变动 {amount} 结算失败")
+                event_result["message"] += "\n（金币结算失败，本次事件未影响余额）"
+            else:
+                event_result.update({"amount": amount, "new_balance": new_balance})
 
         elif effect_type == "level_change":  # 此类型对上市公司无意义
             if is_public:
-                return None
+                return None, company
             current_level = company["level"]
             level_change = value_min  # 此事件的范围通常是固定的-1
 
             if current_level + level_change < 1:
                 await data_manager.delete_company(user_id)
-                event_result = {
+                return {
                     "message": chosen_event["message"]
                     + "\n您的公司已宣告破产，一切归零！",
                     "bankrupt": True,
-                }
+                }, None
             else:
                 new_level = current_level + level_change
-                await data_manager.update_company(user_id, {"level": new_level})
-                new_balance = await self.economy_api.get_coins(user_id)
+                updates["level"] = new_level
+                # 评级变动不涉及金币，无需查询余额
                 event_result = {
                     "message": chosen_event["message"]
                     + f"\n您的公司评级已下降至 Lv.{new_level}！",
-                    "amount": 0,
-                    "new_balance": new_balance,
                 }
 
         # 确保有事件发生才更新冷却时间
         if "message" in event_result:
-            await data_manager.update_company(user_id, {"last_event_time": now})
-            return event_result
+            await data_manager.update_company(user_id, updates)
+            return event_result, replace(company, **updates)
 
-        return None  # 如果没有任何事件类型匹配，则不返回任何内容
+        return None, company  # 如果没有任何事件类型匹配，则不返回任何内容
 
     async def get_company_profile(self, user_id: str, user_name: str) -> str:
         """获取公司信息"""
@@ -1238,26 +1539,42 @@ class CompanyService:
             return "您还没有公司呢，请先使用 /开公司 [公司名] 来创建一家吧。"
 
         now = int(time.time())
-        profile = ""
+        # 逐行收集信息，最后一次性拼接
+        lines: List[str] = []
 
         # --- 步骤 1: 统一处理随机事件 ---
-        event_details = await self._handle_random_event(user_id, company)
+        event_details, company = await self._handle_random_event(user_id, company, now)
         if event_details and event_details.get("bankrupt"):
             return event_details["message"]
 
-        company = await data_manager.get_company(
-            user_id
-        )  # 重新获取，以防事件导致公司破产
-        if not company:
-            return "数据异常：结算后找不到公司信息。可能刚刚破产。"
-
         last_view_time = company.get("last_profile_view_time", 0)
+        # 本次查看需要写回的字段，最后合并为一次更新
+        profile_updates = {"last_profile_view_time": now}
+
+        # 状态效果 (四类合并为一次查询) 与攻击战报所需的新debuff并发读取
+        effects_by_type, new_debuffs = await asyncio.gather(
+            data_manager.get_active_effects_multi(
+                user_id,
+                [
+                    "cost_modifier",
+                    "espionage_chance_modifier",
+                    "income_modifier",
+                    "pr_modifier",
+                ],
+            ),
+            data_manager.get_new_debuffs_since(user_id, last_view_time),
+        )
 
-        display_name = user_name
+        # 董事长本人与所有攻击者的昵称合并为一次批量查询
+        origin_ids = {
+            eff["origin_user_id"] for eff in new_debuffs if eff["origin_user_id"]
+        }
+        nicknames = {}
         if self.nickname_api:
-            custom_name = await self.nickname_api.get_nickname(user_id)
-            if custom_name:
-                display_name = custom_name
+            nicknames = await self.nickname_api.get_nicknames_batch(
+                [user_id, *origin_ids]
+            )
+        display_name = nicknames.get(user_id) or user_name
 
         # --- 步骤 2: 根据公司类型组装核心信息 ---
         if company.get("is_public"):
@@ -1266,8 +1583,10 @@ class CompanyService:
                 return "股票市场服务当前不可用，无法获取公司市值。"
 
             ticker = company["stock_ticker"]
-            market_cap = await self.stock_api.get_market_cap(ticker)
-            price = await self.stock_api.get_stock_price(ticker)
+            # 市值与股价互不依赖，并发查询
+            market_cap, price = await asyncio.gather(
+                self._get_market_cap(ticker), self._get_price(ticker)
+            )
 
             market_cap_str = "无法获取 (市场服务异常)"
             if market_cap is not None and price is not None:
@@ -1283,38 +1602,33 @@ class CompanyService:
                 minutes, _ = divmod(rem, 60)
                 next_report_info = f"下一份财报: {int(hours)}小时{int(minutes)}分钟后"
 
-            profile = (
-                f"🏢「{company['name']}」 (上市公司)\n"
-                f"--------------------\n"
-                f"👤 董事长: {display_name}\n"
-                f"⭐ 公司等级: Lv.{company['level']}\n"
-                f"💹 股票代码: {ticker}\n"
-                f"💰 公司市值: {market_cap_str}\n"
-                f"📋 {next_report_info}\n"
-            )
+            lines += [
+                f"🏢「{company['name']}」 (上市公司)",
+                "--------------------",
+                f"👤 董事长: {display_name}",
+                f"⭐ 公司等级: Lv.{company['level']}",
+                f"💹 股票代码: {ticker}",
+                f"💰 公司市值: {market_cap_str}",
+                f"📋 {next_report_info}",
+            ]
         else:
             # --- 私有公司逻辑 ---
-            await data_manager.clear_expired_effects(user_id)
-            income_modifier_effects = await data_manager.get_active_effects(
-                user_id, "income_modifier"
-            )
-            pr_modifier_effects = await data_manager.get_active_effects(
-                user_id, "pr_modifier"
-            )
-            all_bonus_effects = income_modifier_effects + pr_modifier_effects
-            bonuses = self._get_current_bonuses(company, all_bonus_effects)
+            bonuses = self._get_current_bonuses(company, effects_by_type)
 
-            level_info = config.COMPANY_LEVELS.get(company["level"])
-            base_income = level_info["income_per_hour"]
+            base_income = config.LEVEL_INCOME_PER_HOUR[company["level"]]
             final_income_per_hour = round(base_income * bonuses["operations"])
-            unclaimed_seconds = now - company["last_income_claim_time"]
+            last_claim_time = company["last_income_claim_time"]
+            unclaimed_seconds = now - last_claim_time
             net_income = int(unclaimed_seconds * (final_income_per_hour / 3600))
 
+            # 先在数据库中原子地推进结算时间，抢到这段收益后再发放金币，避免并发查看重复结算
             if net_income > 0:
-                await self.economy_api.add_coins(user_id, net_income, "公司挂机收益")
-                await data_manager.update_company(
-                    user_id, {"last_income_claim_time": now}
-                )
+                if await data_manager.claim_idle_income(user_id, last_claim_time, now):
+                    await self.economy_api.add_coins(
+                        user_id, net_income, "公司挂机收益"
+                    )
+                else:
+                    unclaimed_seconds, net_income = 0, 0
 
             bonus_income = final_income_per_hour - base_income
             income_str = f"{base_income:,.0f}" + (
@@ -1323,9 +1637,9 @@ class CompanyService:
                 else ""
             )
             next_level_info = (
-                f"下一级所需资金：{level_info['upgrade_cost']:,.0f} 金币\n"
+                f"下一级所需资金：{config.LEVEL_UPGRADE_COST[company['level']]:,.0f} 金币"
                 if company["level"] < config.MAX_LEVEL
-                else "已达到最高等级\n"
+                else "已达到最高等级"
             )
 
             # 将随机事件倒计时的计算和显示逻辑，完全放在私有公司的处理分支内
@@ -1335,86 +1649,70 @@ class CompanyService:
             if remaining_cooldown > 0:
                 hours, rem = divmod(remaining_cooldown, 3600)
                 minutes, seconds = divmod(rem, 60)
-                event_cooldown_str = f"⏳ 距离下次随机事件还有 {int(hours)}小时{int(minutes)}分钟{int(seconds)}秒\n"
+                event_cooldown_str = f"⏳ 距离下次随机事件还有 {int(hours)}小时{int(minutes)}分钟{int(seconds)}秒"
             else:
-                event_cooldown_str = "💥 随机事件已准备就绪！\n"
-
-            profile = (
-                f"🏢「{company['name']}」的公司信息\n"
-                f"--------------------\n"
-                f"👤 董事长: {display_name}\n"
-                f"⭐ 公司等级: Lv.{company['level']}\n"
-                f"💼 公司资产: {level_info['assets']:,.0f} 金币\n"
-                f"💰 盈利能力: {income_str} 金币/小时\n"
-                f"{event_cooldown_str}"
-                f"{next_level_info}"
-            )
-            profile += (
-                f"本次为您结算了 {unclaimed_seconds} 秒的挂机收益，共 {net_income:,.0f} 金币。\n"
+                event_cooldown_str = "💥 随机事件已准备就绪！"
+
+            lines += [
+                f"🏢「{company['name']}」的公司信息",
+                "--------------------",
+                f"👤 董事长: {display_name}",
+                f"⭐ 公司等级: Lv.{company['level']}",
+                f"💼 公司资产: {config.LEVEL_ASSETS[company['level']]:,.0f} 金币",
+                f"💰 盈利能力: {income_str} 金币/小时",
+                event_cooldown_str,
+                next_level_info,
+                f"本次为您结算了 {unclaimed_seconds} 秒的挂机收益，共 {net_income:,.0f} 金币。"
                 if unclaimed_seconds > 1
-                else "暂无挂机收益可结算。\n"
-            )
+                else "暂无挂机收益可结算。",
+            ]
 
         # --- 步骤 3: 统一附加所有状态效果 ---
-        await data_manager.clear_expired_effects(user_id)
-
-        income_effects = await data_manager.get_active_effects(
-            user_id, "income_modifier"
-        )
-        cost_effects = await data_manager.get_active_effects(user_id, "cost_modifier")
-        espionage_effects = await data_manager.get_active_effects(
-            user_id, "espionage_chance_modifier"
-        )
-        pr_effects = await data_manager.get_active_effects(user_id, "pr_modifier")
-        all_effects = income_effects + cost_effects + espionage_effects + pr_effects
-
-        if all_effects:
-            profile += "--------------------\n"
-            profile += "当前状态效果:\n"
-            for effect in sorted(all_effects, key=lambda x: x["effect_type"]):
-                potency = effect["potency"]
-                remaining_time = effect["expires_at"] - now
-                hours, rem = divmod(remaining_time, 3600)
-                minutes, _ = divmod(rem, 60)
-                effect_type = effect["effect_type"]
-
-                if effect_type == "income_modifier":
-                    status_icon = "📈" if potency > 1.0 else "📉"
-                    status_text = "士气高涨" if potency > 1.0 else "人才流失"
-                    profile += f"{status_icon} {status_text} (收益 {potency:.0%}), 剩余 {int(hours)}小时{int(minutes)}分钟\n"
+        # 效果已在查询时按类型分组，分组按类型的字母序排列，与原先按 effect_type 排序的结果一致，
+        # 直接逐组遍历即可，无需再拼接或排序
+        if any(effects_by_type.values()):
+            lines += ["--------------------", "当前状态效果:"]
+            for effect_type, effects in effects_by_type.items():
+                for effect in effects:
+                    potency = effect["potency"]
+                    remaining_time = effect["expires_at"] - now
+                    hours, rem = divmod(remaining_time, 3600)
+                    minutes, _ = divmod(rem, 60)
+
+                    if effect_type == "income_modifier":
+                        status_icon = "📈" if potency > 1.0 else "📉"
+                        status_text = "士气高涨" if potency > 1.0 else "人才流失"
+                        lines.append(
+                            f"{status_icon} {status_text} (收益 {potency:.0%}), 剩余 {int(hours)}小时{int(minutes)}分钟"
+                        )
 
-                elif effect_type == "cost_modifier":
-                    status_icon = "🔒"
-                    status_text = "技术封锁"
-                    cost_increase_percent = (potency - 1) * 100
-                    profile += f"{status_icon} {status_text} (所有成本 +{cost_increase_percent:.0f}%), 剩余 {int(hours)}小时{int(minutes)}分钟\n"
+                    elif effect_type == "cost_modifier":
+                        status_icon = "🔒"
+                        status_text = "技术封锁"
+                        cost_increase_percent = (potency - 1) * 100
+                        lines.append(
+                            f"{status_icon} {status_text} (所有成本 +{cost_increase_percent:.0f}%), 剩余 {int(hours)}小时{int(minutes)}分钟"
+                        )
 
-                elif effect_type == "espionage_chance_modifier":
-                    status_icon = "🛡️"
-                    status_text = "安保强化"
-                    profile += f"{status_icon} {status_text} (刺探成功率降低 {abs(potency) * 100:.0f}%), 剩余 {int(hours)}小时{int(minutes)}分钟\n"
+                    elif effect_type == "espionage_chance_modifier":
+                        status_icon = "🛡️"
+                        status_text = "安保强化"
+                        lines.append(
+                            f"{status_icon} {status_text} (刺探成功率降低 {abs(potency) * 100:.0f}%), 剩余 {int(hours)}小时{int(minutes)}分钟"
+                        )
 
-                elif effect_type == "pr_modifier":
-                    status_icon = "🤝"
-                    status_text = "团队凝聚力"
-                    profile += f"{status_icon} {status_text} (公关系数提升 {(potency - 1) * 100:.0f}%), 剩余 {int(hours)}小时{int(minutes)}分钟\n"
+                    elif effect_type == "pr_modifier":
+                        status_icon = "🤝"
+                        status_text = "团队凝聚力"
+                        lines.append(
+                            f"{status_icon} {status_text} (公关系数提升 {(potency - 1) * 100:.0f}%), 剩余 {int(hours)}小时{int(minutes)}分钟"
+                        )
 
         # +++ V3 新增：攻击战报 ---
-        new_debuffs = await data_manager.get_new_debuffs_since(user_id, last_view_time)
         if new_debuffs:
             attacks_by_origin = defaultdict(lambda: {"poach": 0, "espionage": 0})
-            origin_ids = {
-                eff["origin_user_id"] for eff in new_debuffs if eff["origin_user_id"]
-            }
-
-            nicknames = {}
-            if self.nickname_api and origin_ids:
-                nicknames = await self.nickname_api.get_nicknames_batch(
-                    list(origin_ids)
-                )
-
             for debuff in new_debuffs:
-                origin_id = debuff.get("origin_user_id")
+                origin_id = debuff["origin_user_id"]
                 if not origin_id:
                     continue
 
@@ -1424,7 +1722,8 @@ class CompanyService:
                     attacks_by_origin[origin_id]["espionage"] += 1
 
             if attacks_by_origin:
-                report_lines = [
+                lines += [
+                    "",
                     "--------------------",
                     "🚨 安全警报：近期公司遭受攻击！",
                 ]
@@ -1437,29 +1736,28 @@ class CompanyService:
                         parts.append(f"{counts['poach']}次人才挖角")
                     if counts["espionage"] > 0:
                         parts.append(f"{counts['espionage']}次商业刺探")
-                    report_lines.append(
-                        f"- 来自「{attacker_name}」的 {', '.join(parts)}"
-                    )
-                profile += "\n" + "\n".join(report_lines)
+                    lines.append(f"- 来自「{attacker_name}」的 {', '.join(parts)}")
 
         # --- 步骤 4: 统一附加事件信息 ---
         if event_details:
-            event_message = f"\n🚨 突发事件 🚨\n{event_details['message']}"
+            lines += ["", "🚨 突发事件 🚨", event_details["message"]]
             if "amount" in event_details:
                 sign = "+" if event_details["amount"] > 0 else ""
-                event_message += (
-                    f"\n金币变动: {sign}{event_details['amount']:,.0f}\n"
-                    f"当前余额: {event_details['new_balance']:,.0f}"
-                )
-            profile += "\n" + event_message
+                lines += [
+                    f"金币变动: {sign}{event_details['amount']:,.0f}",
+                    f"当前余额: {event_details['new_balance']:,.0f}",
+                ]
 
         # --- 步骤 5: 更新最后查看时间 ---
-        await data_manager.update_company(user_id, {"last_profile_view_time": now})
+        await data_manager.update_company(user_id, profile_updates)
 
-        return profile.strip()
+        return "\n".join(lines).strip()
 
     async def _apply_cost_modifiers(
-        self, user_id: str, initial_cost: float
+        self,
+        user_id: str,
+        initial_cost: float,
+        cost_effects: Optional[List[Dict]] = None,
     ) -> (float, List[Dict]):
         """
         计算应用所有一次性成本修正效果后的最终成本。
@@ -1468,6 +1766,7 @@ class CompanyService:
         Args:
             user_id: 用户的ID。
             initial_cost: 未应用debuff前的原始成本。
+            cost_effects: 调用方已查询到的 cost_modifier 效果，省略时在此查询。
 
         Returns:
             A tuple containing:
@@ -1476,37 +1775,48 @@ class CompanyService:
         """
         final_cost = initial_cost
 
-        cost_effects = await data_manager.get_active_effects(user_id, "cost_modifier")
-        effects_to_consume = [
-            eff for eff in cost_effects if eff.get("is_consumed_on_use")
-        ]
-
-        if effects_to_consume:
-            for effect in effects_to_consume:
-                final_cost = round(final_cost * effect["potency"])
+        if cost_effects is None:
+            cost_effects = await data_manager.get_active_effects(
+                user_id, "cost_modifier"
+            )
+        effects_to_consume = [eff for eff in cost_effects if eff["is_consumed_on_use"]]
+        for effect in effects_to_consume:
+            final_cost = round(final_cost * effect["potency"])
 
         return final_cost, effects_to_consume
 
     async def get_company_ranking(self, limit: int = 10) -> str:
         """获取公司排行榜 (V2 - 兼容市值排名)"""
-        all_companies = await data_manager.get_all_companies()
-        if not all_companies:
-            return "现在还没有人开公司呢，快来抢占先机！"
+        # +++ 核心改造：私有公司的资产只取决于等级，由数据库计算、排序并截取前 limit 名；
+        #     上市公司数量通常很少，单独取出后批量查询股价计算市值 +++
+        private_top, public_companies = await asyncio.gather(
+            data_manager.get_top_private_companies(limit),
+            data_manager.get_public_companies(),
+        )
+        prices = {}
+        if self.stock_api and public_companies:
+            prices = await self._get_prices(
+                [c["stock_ticker"] for c in public_companies]
+            )
 
-        # +++ 核心改造：获取并计算所有公司的真实价值 +++
-        ranking_data = []
-        for company in all_companies:
+        ranking_data = [
+            {
+                "data": company,
+                "asset_value": company["private_value"],
+                "display_type": "资产",
+            }
+            for company in private_top
+        ]
+        for company in public_companies:
             asset_value = 0
             display_type = "资产"
-            if company.get("is_public") and self.stock_api:
-                price = await self.stock_api.get_stock_price(company["stock_ticker"])
+            if self.stock_api:
+                price = prices.get(company["stock_ticker"])
                 if price:
                     asset_value = price * company["total_shares"]
                     display_type = "市值"
             else:
-                asset_value = config.COMPANY_LEVELS.get(company["level"], {}).get(
-                    "assets", 0
-                )
+                asset_value = config.LEVEL_ASSETS[company["level"]]
 
             ranking_data.append(
                 {
@@ -1516,20 +1826,23 @@ class CompanyService:
                 }
             )
 
-        # 按真实价值排序
-        sorted_ranking = sorted(
-            ranking_data, key=lambda x: x["asset_value"], reverse=True
+        if not ranking_data:
+            return "现在还没有人开公司呢，快来抢占先机！"
+
+        # 只需前 limit 名，用堆选出而不必对全部公司排序 (并列时保持原有顺序)
+        top_ranking = heapq.nlargest(
+            limit, ranking_data, key=lambda x: x["asset_value"]
         )
 
         # 获取昵称
-        user_ids = [item["data"]["user_id"] for item in sorted_ranking[:limit]]
+        user_ids = [item["data"]["user_id"] for item in top_ranking]
         nicknames = {}
         if self.nickname_api:
             nicknames = await self.nickname_api.get_nicknames_batch(user_ids)
 
         # 构建排行榜消息
         ranking_list = ["🏆 公司市值排行榜 🏆\n--------------------"]
-        for i, item in enumerate(sorted_ranking[:limit]):
+        for i, item in enumerate(top_ranking):
             company = item["data"]
             user_id, level = company["user_id"], company["level"]
             display_name = nicknames.get(user_id, f"用户({user_id[-4:]})")
@@ -1552,8 +1865,18 @@ class CompanyService:
         if not self.economy_api:
             return "错误：经济系统不可用。"
 
-        attacker_company = await data_manager.get_company(attacker_id)
-        target_company = await data_manager.get_company(target_id)
+        # 双方的公司数据与效果互不依赖，一次并发读取；目标方顺带取出防御与技术封锁效果
+        bonus_types = ["income_modifier", "pr_modifier"]
+        (
+            (attacker_company, attacker_by_type),
+            (target_company, target_by_type),
+        ) = await asyncio.gather(
+            self._load_company_with_effects(attacker_id, bonus_types),
+            self._load_company_with_effects(
+                target_id,
+                bonus_types + ["espionage_chance_modifier", "cost_modifier"],
+            ),
+        )
 
         if not attacker_company:
             return "您还没有公司，无法发起商业行动。"
@@ -1563,38 +1886,20 @@ class CompanyService:
             return f"您的公司需要达到 Lv.{config.DEPARTMENT_UNLOCK_LEVEL} 才能发起商业行动。"
 
         # --- 成本计算 ---
-        await data_manager.clear_expired_effects(attacker_id)
-        # +++ 核心修复：分别获取所需效果并合并 +++
-        attacker_income_effects = await data_manager.get_active_effects(
-            attacker_id, "income_modifier"
-        )
-        attacker_pr_effects = await data_manager.get_active_effects(
-            attacker_id, "pr_modifier"
-        )
-        attacker_effects = attacker_income_effects + attacker_pr_effects
-        attacker_bonuses = self._get_current_bonuses(attacker_company, attacker_effects)
-
-        await data_manager.clear_expired_effects(target_id)
-        target_income_effects = await data_manager.get_active_effects(
-            target_id, "income_modifier"
-        )
-        target_pr_effects = await data_manager.get_active_effects(
-            target_id, "pr_modifier"
-        )
-        target_effects = target_income_effects + target_pr_effects
-        target_bonuses = self._get_current_bonuses(target_company, target_effects)
-        # +++ 修复结束 +++
+        attacker_bonuses = self._get_current_bonuses(attacker_company, attacker_by_type)
+        target_bonuses = self._get_current_bonuses(target_company, target_by_type)
 
         target_level = target_company["level"]
-        target_level_info = config.COMPANY_LEVELS.get(target_level)
-        if not target_level_info:
+        if not 1 <= target_level <= config.MAX_LEVEL:
             return f"错误：无法获取目标公司 Lv.{target_level} 的配置信息。"
 
-        base_income = target_level_info["income_per_hour"]
+        base_income = config.LEVEL_INCOME_PER_HOUR[target_level]
         operations_multiplier = target_bonuses.get("operations", 1.0)
         target_income_per_hour = round(base_income * operations_multiplier)
 
-        cost_hours = random.uniform(*config.INDUSTRIAL_ESPIONAGE_COST_HOURS_RANGE)
+        cost_hours = (
+            _ESPIONAGE_COST_HOURS_LO + _ESPIONAGE_COST_HOURS_SPAN * random.random()
+        )
         base_cost = target_income_per_hour * cost_hours
         final_cost = round(base_cost * attacker_bonuses["research"])
         final_cost = max(final_cost, 5000)
@@ -1606,10 +1911,10 @@ class CompanyService:
         await self.economy_api.add_coins(attacker_id, -final_cost, "发起商业刺探")
 
         # --- 成功率计算 ---
-        target_defense_effects = await data_manager.get_active_effects(
-            target_id, "espionage_chance_modifier"
+        # 防御效果已随目标方的其他效果一次查出，直接在内存中求和，无需再单独查询数据库
+        defense_modifier = math.fsum(
+            effect["potency"] for effect in target_by_type["espionage_chance_modifier"]
         )
-        defense_modifier = sum(effect["potency"] for effect in target_defense_effects)
 
         attacker_level = attacker_company["level"]
         target_level = target_company["level"]
@@ -1624,31 +1929,29 @@ class CompanyService:
             + pr_modifier
             + defense_modifier
         )
-        success_chance = max(
-            config.ESPIONAGE_CHANCE_MIN,
-            min(config.ESPIONAGE_CHANCE_MAX, success_chance),
+        success_chance = (
+            _ESPIONAGE_CHANCE_MIN
+            if success_chance < _ESPIONAGE_CHANCE_MIN
+            else _ESPIONAGE_CHANCE_MAX
+            if success_chance > _ESPIONAGE_CHANCE_MAX
+            else success_chance
         )
 
         if random.random() < success_chance:
             # --- 成功逻辑 ---
-            target_cost_effects = await data_manager.get_active_effects(
-                target_id, "cost_modifier"
+            # 无论目标是否已被全面封锁，成功后都发放投资回报
+            reward_multiplier = (
+                _ESPIONAGE_REWARD_LO + _ESPIONAGE_REWARD_SPAN * random.random()
+            )
+            final_reward = round(final_cost * reward_multiplier)
+            await self.economy_api.add_coins(
+                attacker_id, final_reward, "商业破坏行动成功奖励"
             )
 
+            target_cost_effects = target_by_type["cost_modifier"]
             if len(target_cost_effects) >= config.MAX_COST_DEBUFFS_ON_TARGET:
-                min_m, max_m = config.INDUSTRIAL_ESPIONAGE_REWARD_COST_MULTIPLIER_RANGE
-                reward_multiplier = random.uniform(min_m, max_m)
-                final_reward = round(final_cost * reward_multiplier)
-                await self.economy_api.add_coins(
-                    attacker_id, final_reward, "商业破坏行动成功奖励"
-                )
-
-                return (
-                    f"✅ 破坏成功 (成功率: {success_chance:.0%})！\n"
-                    f"但目标公司的技术已被全面封锁，你的行动未能造成进一步影响。\n"
-                    f"--------------------\n"
-                    f"💵 行动投资: -{final_cost:,.0f} 金币\n"
-                    f"💰 投资回报: +{final_reward:,.0f} 金币！"
+                return _ESPIONAGE_SATURATED_TMPL.format(
+                    chance=success_chance, cost=final_cost, reward=final_reward
                 )
 
             if target_company.get("is_public") and self.stock_api:
@@ -1657,15 +1960,8 @@ class CompanyService:
                     target_ticker, config.STOCK_IMPACT_FROM_ATTACK
                 )
 
-            min_m, max_m = config.INDUSTRIAL_ESPIONAGE_REWARD_COST_MULTIPLIER_RANGE
-            reward_multiplier = random.uniform(min_m, max_m)
-            final_reward = round(final_cost * reward_multiplier)
-            await self.economy_api.add_coins(
-                attacker_id, final_reward, "商业破坏行动成功奖励"
-            )
-
             debuff_potency = round(
-                random.uniform(*config.INDUSTRIAL_ESPIONAGE_DEBUFF_POTENCY_RANGE), 2
+                _ESPIONAGE_DEBUFF_LO + _ESPIONAGE_DEBUFF_SPAN * random.random(), 2
             )
 
             await data_manager.add_effect(
@@ -1677,18 +1973,13 @@ class CompanyService:
                 is_consumed_on_use=True,
             )
 
-            return (
-                f"✅ 破坏成功 (成功率: {success_chance:.0%})！\n"
-                f"您对目标公司造成了严重的商业打击！\n"
-                f"--------------------\n"
-                f"💵 行动投资: -{final_cost:,.0f} 金币\n"
-                f"💰 投资回报: +{final_reward:,.0f} 金币！\n"
-                f"🎯 目标已陷入“技术封锁”，下次升级或改名成本将增加！"
+            return _ESPIONAGE_SUCCESS_TMPL.format(
+                chance=success_chance, cost=final_cost, reward=final_reward
             )
         else:
             # --- 失败逻辑 ---
             penalty_multiplier = round(
-                random.uniform(*config.INDUSTRIAL_ESPIONAGE_PENALTY_MULTIPLIER_RANGE), 2
+                _ESPIONAGE_PENALTY_LO + _ESPIONAGE_PENALTY_SPAN * random.random(), 2
             )
             penalty = round(final_cost * penalty_multiplier)
 
@@ -1703,41 +1994,20 @@ class CompanyService:
                 origin_user_id=attacker_id,
             )
 
-            return (
-                f"❌ 刺探失败 (成功率: {success_chance:.0%})！\n"
-                f"行动已暴露！你的计划不仅让你损失了 {final_cost:,.0f} 金币的投资，"
-                f"还被处以 {penalty:,.0f} 金币的巨额罚款！\n"
-                f"--------------------\n"
-                f"🛡️ 目标公司加强了安保措施，在接下来的一段时间内将更难被刺探。"
+            return _ESPIONAGE_FAILURE_TMPL.format(
+                chance=success_chance, cost=final_cost, penalty=penalty
             )
 
     def _resolve_dept_alias(
         self, company_data: Dict, name_or_alias: str
     ) -> Optional[str]:
         """根据部门名或别名，解析出其在数据库中的标准字段名"""
-        # 别名 -> 标准名 映射
-        alias_map = {
-            company_data.get("dept_ops_alias"): "dept_ops_level",
-            company_data.get("dept_res_alias"): "dept_res_level",
-            company_data.get("dept_pr_alias"): "dept_pr_level",
-        }
-        # 移除 None 键，防止用户别名恰好是 "None" 字符串时出问题
-        alias_map.pop(None, None)
-
-        # 标准名 -> 标准名 映射
-        name_map = {
-            "运营部": "dept_ops_level",
-            "研发部": "dept_res_level",
-            "公关部": "dept_pr_level",
-        }
-
-        # 优先匹配别名，再匹配标准名
-        if name_or_alias in alias_map:
-            return alias_map[name_or_alias]
-        if name_or_alias in name_map:
-            return name_map[name_or_alias]
-
-        return None  # 找不到匹配
+        return _resolve_dept_alias_cached(
+            company_data.get("dept_ops_alias"),
+            company_data.get("dept_res_alias"),
+            company_data.get("dept_pr_alias"),
+            name_or_alias,
+        )
 
     async def set_department_alias(
         self, user_id: str, old_name: str, new_alias: str
@@ -1760,11 +2030,12 @@ class CompanyService:
         ):
             return f"别名「{new_alias}」已被使用或与系统默认名称冲突，请换一个。"
 
-        await data_manager.clear_expired_effects(user_id)
         income_effects = await data_manager.get_active_effects(
             user_id, "income_modifier"
         )
-        bonuses = self._get_current_bonuses(company, income_effects)
+        bonuses = self._get_current_bonuses(
+            company, {"income_modifier": income_effects}
+        )
         base_cost = round(config.DEPARTMENT_RENAME_COST * bonuses["research"])
 
         final_cost, effects_to_consume = await self._apply_cost_modifiers(
@@ -1776,19 +2047,22 @@ class CompanyService:
         if user_coins < final_cost:
             return f"金币不足！部门改名需要 {final_cost:,.0f} 金币。"
 
-        success = await self.economy_api.add_coins(
+        new_balance = await self._add_and_get(
             user_id, -final_cost, f"部门改名为 {new_alias}"
         )
-        if not success:
+        if new_balance is None:
             return "扣款失败，请重试。"
 
         if cost_penalty_applied:
-            for effect in effects_to_consume:
-                await data_manager.consume_effect(effect["effect_id"])
+            await asyncio.gather(
+                *(
+                    data_manager.consume_effect(e["effect_id"])
+                    for e in effects_to_consume
+                )
+            )
 
-        alias_field_name = field_name_to_change.replace("_level", "_alias")
+        alias_field_name = _LEVEL_TO_ALIAS_FIELD[field_name_to_change]
         if await data_manager.update_company(user_id, {alias_field_name: new_alias}):
-            new_balance = await self.economy_api.get_coins(user_id)
             final_message = (
                 f"✅ 部门改名成功！\n"
                 f"您已将「{old_name}」更名为「{new_alias}」。\n"
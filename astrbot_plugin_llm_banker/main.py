@@ -1,6 +1,7 @@
 import asyncio
-from datetime import datetime, timedelta
-from typing import Any, Dict, List
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
 
 # 严格按照您提供的“经济系统API文档”中的模板进行导入
 from ..common.services import shared_services
@@ -11,8 +12,41 @@ from astrbot.api import AstrBotConfig, logger
 from astrbot.api.event import AstrMessageEvent, filter
 
 
-# 存储每个用户当天已获取的额度
-daily_allowance_tracker: Dict[str, int] = {}
+# 收税时间配置无效时使用的默认时间
+DEFAULT_TAX_TIME = time(0, 0, 5)
+
+# 存储每个用户当天已获取的额度，键为 (用户ID, 日期)，跨天后旧日期的键自然失效
+daily_allowance_tracker: Dict[Tuple[str, str], int] = {}
+# 上次清理旧日期额度记录时的日期
+_allowance_pruned_date: str = ""
+
+
+def _today_allowance_key(user_id: str) -> Tuple[str, str]:
+    """返回用户当天的额度记录键，日期变化后顺带清理过期的记录"""
+    global _allowance_pruned_date
+    today = datetime.now().strftime("%Y-%m-%d")
+    if today != _allowance_pruned_date:
+        for key in [k for k in daily_allowance_tracker if k[1] != today]:
+            del daily_allowance_tracker[key]
+        _allowance_pruned_date = today
+    return (user_id, today)
+
+
+def _parse_total_assets(assets_data: Any) -> Optional[float]:
+    """将排行榜中的资产数据解析为浮点数，无法识别时返回 None"""
+    # 常见情况是直接给出数字，精确类型判断后立即返回
+    data_type = type(assets_data)
+    if data_type is int or data_type is float:
+        return float(assets_data)
+    # 也可能是 (总资产, ...) 形式的序列，取第一个元素
+    if data_type is list or data_type is tuple:
+        if not assets_data:
+            return None
+        try:
+            return float(assets_data[0])
+        except (ValueError, TypeError):
+            return None
+    return None
 
 
 @register(
@@ -29,25 +63,79 @@ class LLMBankerPlugin(Star):
         self.economy_api = None
         self.stock_api = None
 
-        self._reset_task_handle: asyncio.Task | None = None
         self._tax_task_handle: asyncio.Task | None = None
 
+        # 配置项快照，工具调用时直接读取属性，无需每次查询配置
+        self._refresh_config()
+
         # 创建一个异步任务来安全地初始化API和定时任务
         asyncio.create_task(self.initialize_plugin())
 
+    def _refresh_config(self):
+        """从插件配置重新生成配置快照，收税任务每轮开始前调用，使配置修改最迟次日生效"""
+        previous = getattr(self, "_cfg", None)
+        tax_time_str = self.config.get("tax_collection_time", "00:00:05")
+        # 收税时间只在配置字符串变化时重新解析，格式错误也只提示一次
+        if previous is not None and previous.tax_time == tax_time_str:
+            tax_target_time = previous.tax_target_time
+        else:
+            try:
+                tax_target_time = datetime.strptime(tax_time_str, "%H:%M:%S").time()
+            except ValueError:
+                logger.error(
+                    f"配置的收税时间 '{tax_time_str}' 格式无效，将使用默认值 00:00:05。"
+                )
+                tax_target_time = DEFAULT_TAX_TIME
+
+        tax_rates = self.config.get("tax_rates", [])
+        if previous is not None and previous.tax_rates == tax_rates:
+            tax_rate_values = previous.tax_rate_values
+        else:
+            tax_rate_values = self._parse_tax_rates(tax_rates)
+
+        self._cfg = SimpleNamespace(
+            bot_id=self.config.get("bot_user_id"),
+            low_balance=self.config.get("low_balance_threshold", 20000),
+            max_tx=self.config.get("max_transaction_amount", 10000),
+            rob_ratio=self.config.get("robbery_threshold_ratio", 5.0),
+            daily_limit=self.config.get("daily_user_allowance_limit", 50000),
+            tax_time=tax_time_str,
+            tax_target_time=tax_target_time,
+            tax_rates=tax_rates,
+            tax_rate_values=tax_rate_values,
+        )
+
+    @staticmethod
+    def _parse_tax_rates(tax_rates: Any) -> Optional[List[Optional[float]]]:
+        """
+        校验配置的税率并逐项转换为浮点数，无效项记为 None (对应排名的玩家不征税)。
+        整体格式不正确时返回 None，表示停用收税。错误只在配置变化时提示一次。
+        """
+        if not isinstance(tax_rates, list) or len(tax_rates) != 10:
+            logger.warning(
+                f"配置中的 'tax_rates' 项缺失或格式不正确（应为10个浮点数的列表），每日收税已停用。当前值: {tax_rates}"
+            )
+            return None
+        values: List[Optional[float]] = []
+        for i, rate in enumerate(tax_rates):
+            try:
+                values.append(float(rate))
+            except (ValueError, TypeError):
+                logger.error(
+                    f"税率 tax_rates[{i}] (值: '{rate}') 无法转换为浮点数，排行第 {i + 1} 的玩家将不被征税。"
+                )
+                values.append(None)
+        return values
+
     async def wait_for_api(self, api_name: str, timeout: int = 30):
-        """通用API等待函数 (已按文档修正)"""
+        """通用API等待函数：服务注册时立即被唤醒，无需轮询"""
         logger.info(f"正在等待 {api_name} 加载...")
-        start_time = asyncio.get_event_loop().time()
-        while True:
-            api_instance = shared_services.get(api_name)
-            if api_instance:
-                logger.info(f"{api_name} 已成功加载。")
-                return api_instance
-            if asyncio.get_event_loop().time() - start_time > timeout:
-                logger.warning(f"等待 {api_name} 超时，相关功能将受限！")
-                return None
-            await asyncio.sleep(1)
+        api_instance = await shared_services.wait_for(api_name, timeout=timeout)
+        if api_instance:
+            logger.info(f"{api_name} 已成功加载。")
+        else:
+            logger.warning(f"等待 {api_name} 超时，相关功能将受限！")
+        return api_instance
 
     async def initialize_plugin(self):
         """
@@ -58,63 +146,55 @@ class LLMBankerPlugin(Star):
 
         if self.economy_api and self.stock_api:
             logger.info("LLM Banker 插件核心API加载完成，功能已就绪。")
-            self._reset_task_handle = asyncio.create_task(self._daily_reset_task())
             self._tax_task_handle = asyncio.create_task(
                 self._daily_tax_collection_task()
             )
         else:
             logger.error("一个或多个核心API未能加载，LLM Banker 插件无法正常运行！")
 
-    async def _daily_reset_task(self):
-        """每日午夜清空用户津贴记录"""
-        try:
-            while True:
-                now = datetime.now()
-                midnight = (now + timedelta(days=1)).replace(
-                    hour=0, minute=0, second=1, microsecond=0
-                )
-                seconds_until_midnight = (midnight - now).total_seconds()
-                logger.info(
-                    f"LLM Banker: 将在 {seconds_until_midnight:.0f} 秒后重置每日津贴。"
-                )
-                await asyncio.sleep(seconds_until_midnight)
-                global daily_allowance_tracker
-                daily_allowance_tracker.clear()
-                logger.info("LLM Banker: 每日用户津贴已重置。")
-        except asyncio.CancelledError:
-            logger.info("LLM Banker: 每日津贴重置任务被终止。")
-            raise  # 重新抛出异常以确认取消
-
     async def _daily_tax_collection_task(self):
         """每日按时对总资产排名前10的玩家征税"""
+        loop = asyncio.get_running_loop()
+        # 下一次唤醒的单调时钟时间点；首次计算后每天直接累加 86400 秒，
+        # 税收时间变更或每满一周时再用 datetime 重新对齐一次（兼顾夏令时/时钟调整）
+        next_wake: Optional[float] = None
+        synced_target: Optional[time] = None
+        days_since_sync = 0
         try:
             while True:
                 # 1. 获取配置的税收时间
-                tax_time_str = self.config.get("tax_collection_time", "00:00:05")
-                try:
-                    target_time = datetime.strptime(tax_time_str, "%H:%M:%S").time()
-                except ValueError:
-                    logger.error(
-                        f"配置的收税时间 '{tax_time_str}' 格式无效，将使用默认值 00:00:05。"
-                    )
-                    target_time = datetime.strptime("00:00:05", "%H:%M:%S").time()
+                self._refresh_config()
+                target_time = self._cfg.tax_target_time
 
                 # 2. 计算下一次执行时间
-                now = datetime.now()
-                today_target = datetime.combine(now.date(), target_time)
-
-                if now >= today_target:
-                    tomorrow_date = now.date() + timedelta(days=1)
-                    next_tax_time = datetime.combine(tomorrow_date, target_time)
+                if (
+                    next_wake is None
+                    or target_time != synced_target
+                    or days_since_sync >= 7
+                ):
+                    now = datetime.now()
+                    today_target = datetime.combine(now.date(), target_time)
+
+                    if now >= today_target:
+                        tomorrow_date = now.date() + timedelta(days=1)
+                        next_tax_time = datetime.combine(tomorrow_date, target_time)
+                    else:
+                        next_tax_time = today_target
+
+                    next_wake = loop.time() + (next_tax_time - now).total_seconds()
+                    synced_target = target_time
+                    days_since_sync = 0
+                    logger.info(
+                        f"LLM Banker: 将在 {next_wake - loop.time():.0f} 秒后 (即 {next_tax_time}) 开始征收资产税。"
+                    )
                 else:
-                    next_tax_time = today_target
-
-                seconds_until_tax_time = (next_tax_time - now).total_seconds()
+                    next_wake += 86400.0
+                    logger.info(
+                        f"LLM Banker: 将在 {next_wake - loop.time():.0f} 秒后开始征收资产税。"
+                    )
+                days_since_sync += 1
 
-                logger.info(
-                    f"LLM Banker: 将在 {seconds_until_tax_time:.0f} 秒后 (即 {next_tax_time}) 开始征收资产税。"
-                )
-                await asyncio.sleep(seconds_until_tax_time)
+                await asyncio.sleep(max(0.0, next_wake - loop.time()))
 
                 # 3. --- 执行收税逻辑 ---
                 logger.info("LLM Banker: 开始执行每日资产税征收流程...")
@@ -123,12 +203,10 @@ class LLMBankerPlugin(Star):
                     logger.error("收税任务失败：API未加载。")
                     continue
 
-                tax_rates: List[Any] = self.config.get("tax_rates", [])  # 改为 Any
-
-                if not isinstance(tax_rates, list) or len(tax_rates) != 10:
-                    logger.warning(
-                        f"配置中的 'tax_rates' 项缺失或格式不正确（应为10个浮点数的列表），跳过本次收税。当前值: {tax_rates}"
-                    )
+                # 税率已在加载配置时校验并转换为浮点数，格式不正确时为 None
+                tax_rate_values = self._cfg.tax_rate_values
+                if tax_rate_values is None:
+                    logger.info("税率配置无效，跳过本次收税。")
                     continue
 
                 try:
@@ -140,40 +218,27 @@ class LLMBankerPlugin(Star):
 
                     logger.info(f"成功获取到 {len(ranking)} 位玩家的资产排行。")
 
-                    bot_id = self.config.get("bot_user_id")
+                    bot_id = self._cfg.bot_id
 
                     if not bot_id:
                         logger.error("收税失败：机器人账户 bot_user_id 未配置。")
                         continue
 
+                    # 先算出每位玩家的税额，最后统一扣款入账
+                    taxes: List[tuple] = []
                     for i, player_data in enumerate(ranking):
                         user_id = player_data.get("user_id")
 
                         assets_data = player_data.get("total_assets")
-                        total_assets_numeric = 0.0
-
-                        if isinstance(assets_data, (list, tuple)) and assets_data:
-                            try:
-                                total_assets_numeric = float(assets_data[0])
-                            except (ValueError, TypeError, IndexError):
-                                logger.warning(
-                                    f"玩家 {user_id} 的资产数据是序列，但第一个元素不是有效数字或为空: {assets_data}"
-                                )
-                                total_assets_numeric = 0.0
-                        elif isinstance(assets_data, (int, float)):
-                            total_assets_numeric = float(assets_data)
-                        else:
+                        total_assets_numeric = _parse_total_assets(assets_data)
+                        if total_assets_numeric is None:
                             logger.warning(
-                                f"玩家 {user_id} 的资产数据格式无法识别 (非数字/序列)，将计为0. 数据: {assets_data} (类型: {type(assets_data)})"
+                                f"玩家 {user_id} 的资产数据格式无法识别 (非数字/首项为数字的序列)，将计为0. 数据: {assets_data} (类型: {type(assets_data)})"
                             )
                             total_assets_numeric = 0.0
 
-                        try:
-                            tax_rate = float(tax_rates[i])
-                        except (ValueError, TypeError, IndexError):
-                            logger.error(
-                                f"玩家 {user_id} 的税率 tax_rates[{i}] (值: '{tax_rates[i]}') 无法转换为浮点数，跳过此玩家。"
-                            )
+                        tax_rate = tax_rate_values[i]
+                        if tax_rate is None:
                             continue
 
                         tax_amount = int(total_assets_numeric * tax_rate)
@@ -181,27 +246,17 @@ class LLMBankerPlugin(Star):
                         if tax_amount <= 0:
                             continue
 
-                        logger.info(
-                            f"向排行第 {i + 1} 的玩家 {user_id} (总资产: {assets_data}) 征收 {tax_rate * 100:.2f}% 的税，金额: {tax_amount}"
-                        )
-
-                        op1 = await self.economy_api.add_coins(
-                            user_id, -tax_amount, "每日资产税"
-                        )
-                        op2 = await self.economy_api.add_coins(
-                            bot_id, tax_amount, f"收取来自 {user_id} 的每日资产税"
-                        )
-
-                        if not (op1 and op2):
-                            logger.error(f"向玩家 {user_id} 收税时发生错误，尝试回滚。")
-                            await self.economy_api.add_coins(
-                                user_id, tax_amount, "收税失败回滚"
-                            )
-                            await self.economy_api.add_coins(
-                                bot_id, -tax_amount, "收税失败回滚"
-                            )
+                        taxes.append((user_id, tax_amount))
 
-                    logger.info("LLM Banker: 每日资产税征收流程执行完毕。")
+                    collected = await self._collect_taxes(bot_id, taxes)
+                    # 整轮只输出一条汇总日志，只统计实际扣款成功的部分；
+                    # 使用惰性格式化，日志级别高于 INFO 时不拼接明细
+                    logger.info(
+                        "LLM Banker: 每日资产税征收流程执行完毕，共 %d 人，总税额 %d，明细: %s",
+                        len(collected),
+                        sum(tax_amount for _, tax_amount in collected),
+                        collected,
+                    )
 
                 except Exception as e:
                     logger.error(f"执行收税任务时发生意外错误: {e}", exc_info=True)
@@ -210,6 +265,77 @@ class LLMBankerPlugin(Star):
             logger.info("LLM Banker: 每日收税任务被终止。")
             raise  # 重新抛出异常以确认取消
 
+    async def _collect_taxes(self, bot_id: str, taxes: List[tuple]) -> List[tuple]:
+        """扣除各玩家的税款并转入机器人账户，经济系统支持批量接口时在一个事务中完成
+
+        返回实际收取成功的 (user_id, tax_amount) 列表。
+        """
+        if not taxes:
+            return []
+
+        add_coins_bulk = getattr(self.economy_api, "add_coins_bulk", None)
+        if add_coins_bulk:
+            entries = []
+            for user_id, tax_amount in taxes:
+                entries.append((user_id, -tax_amount, "每日资产税"))
+                entries.append((bot_id, tax_amount, f"收取来自 {user_id} 的每日资产税"))
+            if not await add_coins_bulk(entries):
+                logger.error("批量收税失败，本次所有税款均未扣除。")
+                return []
+            return taxes
+
+        # 逐个玩家扣款：每笔都要改动机器人余额，不能并发执行
+        collected = []
+        for user_id, tax_amount in taxes:
+            op1 = await self.economy_api.add_coins(user_id, -tax_amount, "每日资产税")
+            op2 = await self.economy_api.add_coins(
+                bot_id, tax_amount, f"收取来自 {user_id} 的每日资产税"
+            )
+
+            if not (op1 and op2):
+                logger.error(f"向玩家 {user_id} 收税时发生错误，尝试回滚。")
+                await self.economy_api.add_coins(user_id, tax_amount, "收税失败回滚")
+                await self.economy_api.add_coins(bot_id, -tax_amount, "收税失败回滚")
+            else:
+                collected.append((user_id, tax_amount))
+        return collected
+
+    async def _move_coins(
+        self,
+        from_user_id: str,
+        to_user_id: str,
+        amount: int,
+        from_reason: str,
+        to_reason: str,
+        allow_debt: bool = False,
+    ) -> bool:
+        """在两个账户间转移金币：经济系统支持时在一个事务中完成，否则分两笔执行并在失败时回滚"""
+        atomic_transfer = getattr(self.economy_api, "atomic_transfer", None)
+        if atomic_transfer:
+            return await atomic_transfer(
+                from_user_id, to_user_id, amount, from_reason, to_reason, allow_debt
+            )
+
+        # 双方账户互不相同，两笔变动可并发执行
+        op1, op2 = await asyncio.gather(
+            self.economy_api.add_coins(from_user_id, -amount, from_reason),
+            self.economy_api.add_coins(to_user_id, amount, to_reason),
+        )
+        if op1 and op2:
+            return True
+        # 只回滚实际已成功的那一笔
+        rollbacks = []
+        if op1:
+            rollbacks.append(
+                self.economy_api.add_coins(from_user_id, amount, "交易失败回滚")
+            )
+        if op2:
+            rollbacks.append(
+                self.economy_api.add_coins(to_user_id, -amount, "交易失败回滚")
+            )
+        await asyncio.gather(*rollbacks)
+        return False
+
     @filter.llm_tool(name="query_my_bot_balance")
     async def query_my_balance(self, event: AstrMessageEvent) -> str:
         """
@@ -220,12 +346,12 @@ class LLMBankerPlugin(Star):
         if not self.economy_api:
             return "经济系统未就绪，我查不了账。"
 
-        bot_id = self.config.get("bot_user_id")
+        bot_id = self._cfg.bot_id
         if not bot_id:
             return "我的管家没给我配置账户ID，我没有钱。"
 
         balance = await self.economy_api.get_coins(bot_id)
-        threshold = self.config.get("low_balance_threshold", 20000)
+        threshold = self._cfg.low_balance
 
         if balance < threshold:
             return f"我目前只有 {balance} 金币了，钱包告急，得省着点花才行。"
@@ -243,13 +369,15 @@ class LLMBankerPlugin(Star):
         """
         if not self.economy_api:
             return "经济系统未就绪，无法评估。"
-        bot_id = self.config.get("bot_user_id")
+        bot_id = self._cfg.bot_id
         if not bot_id:
             return "我的账户未配置，无法进行比较。"
 
-        bot_balance = await self.economy_api.get_coins(bot_id)
-        user_balance = await self.economy_api.get_coins(target_user_id)
-        rob_ratio = self.config.get("robbery_threshold_ratio", 5.0)
+        bot_balance, user_balance = await asyncio.gather(
+            self.economy_api.get_coins(bot_id),
+            self.economy_api.get_coins(target_user_id),
+        )
+        rob_ratio = self._cfg.rob_ratio
 
         if bot_balance > 0 and user_balance > bot_balance * rob_ratio:
             ratio = user_balance / bot_balance
@@ -273,7 +401,7 @@ class LLMBankerPlugin(Star):
         if not self.economy_api:
             return {"success": False, "error": "经济系统API未连接。"}
 
-        bot_id = self.config.get("bot_user_id")
+        bot_id = self._cfg.bot_id
         if not bot_id:
             return {"success": False, "error": "机器人账户未在配置中设定。"}
 
@@ -283,13 +411,13 @@ class LLMBankerPlugin(Star):
         if amount <= 0:
             return {"success": False, "error": "转账金额必须是正数。"}
 
-        max_amount = self.config.get("max_transaction_amount", 10000)
+        max_amount = self._cfg.max_tx
         if amount > max_amount:
             return {"success": False, "error": f"单次转账金额不能超过 {max_amount}。"}
 
-        global daily_allowance_tracker
-        current_allowance = daily_allowance_tracker.get(target_user_id, 0)
-        daily_limit = self.config.get("daily_user_allowance_limit", 50000)
+        allowance_key = _today_allowance_key(target_user_id)
+        current_allowance = daily_allowance_tracker.get(allowance_key, 0)
+        daily_limit = self._cfg.daily_limit
         if current_allowance + amount > daily_limit:
             return {
                 "success": False,
@@ -297,7 +425,7 @@ class LLMBankerPlugin(Star):
             }
 
         bot_balance = await self.economy_api.get_coins(bot_id)
-        low_balance_threshold = self.config.get("low_balance_threshold", 20000)
+        low_balance_threshold = self._cfg.low_balance
         if bot_balance < low_balance_threshold:
             return {
                 "success": False,
@@ -309,23 +437,19 @@ class LLMBankerPlugin(Star):
                 "error": f"我的钱不够了，当前只有 {bot_balance} 金币。",
             }
 
-        op1 = await self.economy_api.add_coins(
-            bot_id, -amount, f"转账给 {target_user_id} ({reason})"
-        )
-        op2 = await self.economy_api.add_coins(
-            target_user_id, amount, f"收到机器人转账 ({reason})"
-        )
-
-        if op1 and op2:
-            daily_allowance_tracker[target_user_id] = current_allowance + amount
+        if await self._move_coins(
+            bot_id,
+            target_user_id,
+            amount,
+            f"转账给 {target_user_id} ({reason})",
+            f"收到机器人转账 ({reason})",
+        ):
+            daily_allowance_tracker[allowance_key] = current_allowance + amount
             return {
                 "success": True,
                 "message": f"操作成功，已向用户 {target_user_id} 转账 {amount} 金币。",
             }
-        else:
-            await self.economy_api.add_coins(bot_id, amount, "交易失败回滚")
-            await self.economy_api.add_coins(target_user_id, -amount, "交易失败回滚")
-            return {"success": False, "error": "转账过程中发生未知错误，交易已取消。"}
+        return {"success": False, "error": "转账过程中发生未知错误，交易已取消。"}
 
     @filter.llm_tool(name="take_coins_from_user")
     async def take_coins_from_user(
@@ -341,7 +465,7 @@ class LLMBankerPlugin(Star):
         if not self.economy_api:
             return {"success": False, "error": "经济系统API未连接。"}
 
-        bot_id = self.config.get("bot_user_id")
+        bot_id = self._cfg.bot_id
         if not bot_id:
             return {"success": False, "error": "机器人账户未在配置中设定。"}
 
@@ -351,26 +475,24 @@ class LLMBankerPlugin(Star):
         if amount <= 0:
             return {"success": False, "error": "操作金额必须是正数。"}
 
-        max_amount = self.config.get("max_transaction_amount", 10000)
+        max_amount = self._cfg.max_tx
         if amount > max_amount:
             return {"success": False, "error": f"单次操作金额不能超过 {max_amount}。"}
 
-        op1 = await self.economy_api.add_coins(
-            target_user_id, -amount, f"被机器人扣款 ({reason})"
-        )
-        op2 = await self.economy_api.add_coins(
-            bot_id, amount, f"从 {target_user_id} 处收款 ({reason})"
-        )
-
-        if op1 and op2:
+        # 经济系统允许欠款，扣款不要求用户余额充足
+        if await self._move_coins(
+            target_user_id,
+            bot_id,
+            amount,
+            f"被机器人扣款 ({reason})",
+            f"从 {target_user_id} 处收款 ({reason})",
+            allow_debt=True,
+        ):
             return {
                 "success": True,
                 "message": f"操作成功，已从用户 {target_user_id} 处取走 {amount} 金币。",
             }
-        else:
-            await self.economy_api.add_coins(target_user_id, amount, "交易失败回滚")
-            await self.economy_api.add_coins(bot_id, -amount, "交易失败回滚")
-            return {"success": False, "error": "扣款过程中发生未知错误，交易已取消。"}
+        return {"success": False, "error": "扣款过程中发生未知错误，交易已取消。"}
 
     # 插件终止函数
     async def terminate(self):
@@ -379,10 +501,6 @@ class LLMBankerPlugin(Star):
         """
         logger.info("LLM Banker 插件正在终止，开始清理后台定时任务...")
 
-        if self._reset_task_handle and not self._reset_task_handle.done():
-            self._reset_task_handle.cancel()
-            logger.info("每日津贴重置任务已请求取消。")
-
         if self._tax_task_handle and not self._tax_task_handle.done():
             self._tax_task_handle.cancel()
             logger.info("每日收税任务已请求取消。")
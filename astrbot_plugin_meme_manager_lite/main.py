@@ -11,6 +11,18 @@ from astrbot.core.message.components import Image, Plain
 from astrbot.core.provider.entities import LLMResponse, ProviderRequest
 from astrbot.core.star.star_tools import StarTools
 
+# 贴纸标签相关正则，在模块加载时预编译，避免每条消息重复查找/解析
+_STICKER_TAG_RE = re.compile(r"<sticker\s*[^>]*\/>")
+# 单次扫描即可切分出标签并取得 name / force 属性（属性顺序不限）
+_STICKER_FULL_RE = re.compile(
+    r"<sticker"
+    r'(?:(?=[^>]*?name="(?P<name>[^"]+)"))?'
+    r'(?:(?=[^>]*?(?P<force>force="true")))?'
+    r".*?/>",
+    re.DOTALL,
+)
+_IMAGE_EXTENSIONS = frozenset({"png", "jpg", "jpeg", "gif", "webp"})
+
 
 @register(
     "astrbot_plugin_meme_manager_lite",
@@ -38,6 +50,10 @@ class StickerManagerLitePlugin(Star):
         self.STICKERS_DIR = os.path.join(self.DATA_DIR, "memes")
         self.STICKERS_DATA_FILE = os.path.join(self.DATA_DIR, "memes_data.json")
         self.stickers_data: dict[str, str] = {}
+        # 贴纸名 -> (目录 mtime, 图片路径列表)，目录未变化时不再重复扫描
+        self._sticker_index: dict[str, tuple[float, list[str]]] = {}
+        # 注入到系统提示词中的表情包指令，随贴纸数据加载时一次性生成
+        self._system_suffix = ""
 
     async def initialize(self):
         """可选择实现异步的插件初始化方法，当实例化该插件类之后会自动调用该方法。"""
@@ -104,29 +120,37 @@ class StickerManagerLitePlugin(Star):
         except Exception as e:
             logger.error(f"加载贴纸数据失败: {e}")
             self.stickers_data = {}
+        self._system_suffix = self._build_system_suffix()
 
     def _get_sticker_image_path(self, sticker_name: str) -> str | None:
         """获取贴纸图片路径，存在多张图片时随机选择"""
         sticker_dir = os.path.join(self.STICKERS_DIR, sticker_name)
-        if os.path.exists(sticker_dir):
-            try:
+        try:
+            st = os.stat(sticker_dir)
+        except OSError:
+            return None
+        try:
+            cached = self._sticker_index.get(sticker_name)
+            if cached and cached[0] == st.st_mtime:
+                image_files = cached[1]
+            else:
                 image_files = []
-                for file in os.listdir(sticker_dir):
-                    if file.lower().endswith(
-                        (".png", ".jpg", ".jpeg", ".gif", ".webp")
-                    ):
-                        image_files.append(os.path.join(sticker_dir, file))
-                if image_files:
-                    return random.choice(image_files)
-            except Exception as e:
-                logger.error(f"读取贴纸目录失败: {e}")
+                with os.scandir(sticker_dir) as it:
+                    for entry in it:
+                        _, dot, ext = entry.name.rpartition(".")
+                        if dot and ext.lower() in _IMAGE_EXTENSIONS:
+                            image_files.append(entry.path)
+                self._sticker_index[sticker_name] = (st.st_mtime, image_files)
+            if image_files:
+                return random.choice(image_files)
+        except Exception as e:
+            logger.error(f"读取贴纸目录失败: {e}")
         return None
 
     def _remove_sticker_tags(self, text: str) -> str:
         """移除文本中的贴纸标签"""
         # 这个正则表达式现在可以正确处理带属性的标签
-        pattern = r"<sticker\s*[^>]*\/>"
-        return re.sub(pattern, "", text).strip()
+        return _STICKER_TAG_RE.sub("", text).strip()
 
     def _generate_sticker_list(self) -> str:
         """生成贴纸清单"""
@@ -135,12 +159,8 @@ class StickerManagerLitePlugin(Star):
             sticker_list.append(f"- [{name}]：{description}")
         return "\n".join(sticker_list)
 
-    @filter.on_llm_request()
-    async def on_llm_req(self, event: AstrMessageEvent, req: ProviderRequest):
-        """
-        【已修改】
-        向LLM注入新的、更精确的系统指令，教会它使用 force="true" 属性。
-        """
+    def _build_system_suffix(self) -> str:
+        """生成注入系统提示词的表情包指令，教会LLM使用 force="true" 属性。"""
         sticker_list = self._generate_sticker_list()
 
         instruction_prompt = f"""
@@ -159,7 +179,16 @@ class StickerManagerLitePlugin(Star):
 「可用贴纸清单」:
 {sticker_list}
 """
-        req.system_prompt += f"\n\n{instruction_prompt}"
+        return f"\n\n{instruction_prompt}"
+
+    @filter.on_llm_request()
+    async def on_llm_req(self, event: AstrMessageEvent, req: ProviderRequest):
+        """
+        【已修改】
+        向LLM注入新的、更精确的系统指令，教会它使用 force="true" 属性。
+        指令文本在加载贴纸数据时已预先生成。
+        """
+        req.system_prompt += self._system_suffix
 
     @filter.on_llm_response()
     async def on_llm_resp(self, event: AstrMessageEvent, resp: LLMResponse):
@@ -197,40 +226,35 @@ class StickerManagerLitePlugin(Star):
                     components.append(Plain(text.strip()))
                 return components
 
-            pattern = r"(<sticker.*?\/>)"
-            parts = re.split(pattern, text, flags=re.DOTALL)
+            last = 0
+            for match in _STICKER_FULL_RE.finditer(text):
+                # 标签之前的文本部分
+                part = text[last : match.start()].strip()
+                if part:
+                    components.append(Plain(part))
+                last = match.end()
 
-            for i, part in enumerate(parts):
-                if not part:
-                    continue
+                sticker_name = match["name"]
+                force = match["force"] is not None  # 检查是否存在force="true"
 
-                # 偶数索引是文本部分
-                if i % 2 == 0:
-                    if part.strip():
-                        components.append(Plain(part.strip()))
-                # 奇数索引是标签部分
-                else:
-                    tag = part
-                    name_match = re.search(r'name="([^"]+)"', tag)
-                    force_match = re.search(
-                        r'force="true"', tag
-                    )  # 检查是否存在force="true"
-
-                    if name_match:
-                        sticker_name = name_match.group(1)
-                        image_path = self._get_sticker_image_path(sticker_name)
-
-                        # 如果标签包含 force="true"，或者随机概率命中
-                        if image_path and (
-                            force_match
-                            or random.random() < self.sticker_trigger_probability
-                        ):
-                            components.append(Image.fromFileSystem(image_path))
-                        # 如果是强制发送但图片不存在，可以给个提示
-                        elif force_match and not image_path:
-                            components.append(
-                                Plain(f"（菲比没有找到“{sticker_name}”表情）")
-                            )
+                if sticker_name:
+                    image_path = self._get_sticker_image_path(sticker_name)
+
+                    # 如果标签包含 force="true"，或者随机概率命中
+                    if image_path and (
+                        force or random.random() < self.sticker_trigger_probability
+                    ):
+                        components.append(Image.fromFileSystem(image_path))
+                    # 如果是强制发送但图片不存在，可以给个提示
+                    elif force and not image_path:
+                        components.append(
+                            Plain(f"（菲比没有找到“{sticker_name}”表情）")
+                        )
+
+            # 最后一个标签之后的文本部分
+            part = text[last:].strip()
+            if part:
+                components.append(Plain(part))
 
         except Exception as e:
             logger.error(f"处理文本和sticker标签时出错: {e}")
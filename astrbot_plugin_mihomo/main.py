@@ -1,6 +1,8 @@
 import aiohttp
 import json
 import asyncio
+import os
+import time
 import urllib.parse
 from pathlib import Path
 from typing import List, Dict, Tuple
@@ -9,6 +11,15 @@ from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register, StarTools
 from astrbot.api import logger, AstrBotConfig
 
+# 优先使用 orjson 解析/序列化 JSON，未安装时回退到标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 策略组测速结果在该时间（秒）内视为新鲜，不再重复触发测速
+DELAY_TEST_TTL = 30
+
 
 @register("astrbot_plugin_mihomo", "timetetng", "Mihomo内核管理", "1.0.2", "")
 class MihomoPlugin(Star):
@@ -23,15 +34,22 @@ class MihomoPlugin(Star):
 
         # 缓存
         self.selection_cache = {}
+        # 长连接会话，首次请求时创建，复用连接池与 keep-alive
+        self._session: aiohttp.ClientSession | None = None
+        # 策略组名 -> 上次测速完成的单调时间
+        self._last_delay_test: dict[str, float] = {}
 
         self.data_dir = Path(StarTools.get_data_dir("astrbot_plugin_mihomo"))
         self.data_file = self.data_dir / "data.json"
 
         # 加载数据
         self.data = self._load_data()
+        # 数据变更后只标记为脏，由后台任务定期落盘
+        self._dirty = False
 
         # 启动后台监控任务
         self.monitor_task = asyncio.create_task(self._monitor_loop())
+        self.flush_task = asyncio.create_task(self._flush_loop())
 
     # ================= 数据持久化 =================
 
@@ -39,40 +57,69 @@ class MihomoPlugin(Star):
         if not self.data_file.exists():
             return {"custom_groups": {}, "auto_tasks": {}}
         try:
-            with open(self.data_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+            raw = self.data_file.read_bytes()
+            return orjson.loads(raw) if orjson else json.loads(raw)
         except Exception as e:
             logger.error(f"[Mihomo] Load data failed: {e}")
             return {"custom_groups": {}, "auto_tasks": {}}
 
-    def _save_data(self):
+    def _save_data(self) -> bool:
         try:
             # 确保目录存在
             if not self.data_dir.exists():
                 self.data_dir.mkdir(parents=True, exist_ok=True)
 
-            with open(self.data_file, "w", encoding="utf-8") as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            # 先写临时文件再原子替换，避免写入中途崩溃导致数据文件损坏
+            tmp_file = self.data_file.with_suffix(".json.tmp")
+            if orjson:
+                tmp_file.write_bytes(
+                    orjson.dumps(
+                        self.data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                    )
+                )
+            else:
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.data_file)
+            return True
         except Exception as e:
             logger.error(f"[Mihomo] Save data failed: {e}")
+            return False
+
+    async def _flush_loop(self):
+        """后台任务：每 5 秒检查一次，有改动时才写盘"""
+        while True:
+            await asyncio.sleep(5)
+            if self._dirty:
+                self._dirty = False
+                if not self._save_data():
+                    self._dirty = True
 
     # ================= 核心工具 =================
 
     async def _request(self, method: str, path: str, data: dict = None, timeout=5):
         url = f"{self.api_url}{path}"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.request(
-                    method, url, json=data, headers=self.headers, timeout=timeout
-                ) as resp:
-                    if resp.status == 204:
-                        return True
-                    if resp.status >= 400:
-                        return {
-                            "error": f"HTTP {resp.status}",
-                            "detail": await resp.text(),
-                        }
-                    return await resp.json()
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession(
+                    headers=self.headers,
+                    timeout=aiohttp.ClientTimeout(total=10),
+                    connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60),
+                )
+            async with self._session.request(
+                method, url, json=data, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as resp:
+                if resp.status == 204:
+                    return True
+                if resp.status >= 400:
+                    return {
+                        "error": f"HTTP {resp.status}",
+                        "detail": await resp.text(),
+                    }
+                body = await resp.read()
+                if not body.strip():
+                    return None
+                return orjson.loads(body) if orjson else json.loads(body)
         except Exception as e:
             return {"error": "Error", "detail": str(e)}
 
@@ -84,10 +131,10 @@ class MihomoPlugin(Star):
             return 88888, "Timeout"
         return delay, f"{delay}ms"
 
-    async def _get_smart_group(self) -> Tuple[str, str]:
-        """获取主策略组名称"""
-        data = await self._request("GET", "/proxies")
-        if isinstance(data, dict) and "error" in data:
+    @staticmethod
+    def _pick_smart_group(data) -> Tuple[str, str]:
+        """从 /proxies 的返回结果中选出主策略组名称"""
+        if not isinstance(data, dict) or "error" in data:
             return None, "API连接失败"
 
         selectors = [
@@ -105,9 +152,13 @@ class MihomoPlugin(Star):
                     return s, None
         return selectors[0], None
 
-    async def _resolve_nodes(self, target: str) -> List[str]:
-        """解析目标（关键词或自定义组）为具体的节点名称列表"""
-        data = await self._request("GET", "/proxies")
+    async def _resolve_nodes(self, target: str, data: dict = None) -> List[str]:
+        """解析目标（关键词或自定义组）为具体的节点名称列表
+
+        可传入已获取的 /proxies 结果，避免重复请求。
+        """
+        if data is None:
+            data = await self._request("GET", "/proxies")
         if not data or "error" in data:
             return []
 
@@ -118,7 +169,7 @@ class MihomoPlugin(Star):
             return [n for n in self.data["custom_groups"][target] if n in all_proxies]
 
         # 2. 否则视为关键词，从主策略组筛选
-        group_name, _ = await self._get_smart_group()
+        group_name, _ = self._pick_smart_group(data)
         if not group_name:
             return []
 
@@ -129,6 +180,20 @@ class MihomoPlugin(Star):
             return all_nodes  # 全部
         return [n for n in all_nodes if target.lower() in n.lower()]
 
+    async def _ensure_delay_test(self, group_name: str):
+        """触发策略组测速并等待结果；最近已测过则直接复用"""
+        now = time.monotonic()
+        if now - self._last_delay_test.get(group_name, 0) <= DELAY_TEST_TTL:
+            return
+        encoded = urllib.parse.quote(group_name)
+        await self._request(
+            "GET",
+            f"/group/{encoded}/delay?url=http://www.gstatic.com/generate_204&timeout=2000",
+            timeout=3,
+        )
+        await asyncio.sleep(3)  # 等待结果
+        self._last_delay_test[group_name] = time.monotonic()
+
     # ================= 后台监控逻辑 =================
 
     async def _monitor_loop(self):
@@ -141,37 +206,41 @@ class MihomoPlugin(Star):
                     await asyncio.sleep(60)  # 没有任务时休眠久一点
                     continue
 
+                interval = 300  # 默认等待时间
+                # 每轮只拉取一次 /proxies，所有任务共享
+                proxy_data = await self._request("GET", "/proxies")
+                group_name, _ = self._pick_smart_group(proxy_data)
+
+                # 获取各任务的节点列表
+                targets = []
                 for target, config in list(tasks.items()):
-                    if not config.get("enable", False):
+                    interval = config.get("interval", 300)
+                    if not config.get("enable", False) or not group_name:
                         continue
+                    nodes = await self._resolve_nodes(target, proxy_data)
+                    if nodes:
+                        targets.append((target, nodes))
 
-                    # 获取节点列表
-                    nodes = await self._resolve_nodes(target)
-                    if not nodes:
-                        continue
+                if not targets:
+                    await asyncio.sleep(interval)
+                    continue
 
-                    # 1. 测速
-                    group_name, _ = await self._get_smart_group()
-                    if not group_name:
-                        continue
+                # 1. 触发测速（所有任务同属主策略组，只需测一次）
+                await self._ensure_delay_test(group_name)
 
-                    # 触发测速
-                    encoded = urllib.parse.quote(group_name)
-                    await self._request(
-                        "GET",
-                        f"/group/{encoded}/delay?url=http://www.gstatic.com/generate_204&timeout=2000",
-                        timeout=3,
-                    )
-                    await asyncio.sleep(3)  # 等待结果
+                # 2. 获取最新延迟
+                proxy_data = await self._request("GET", "/proxies")
+                if not proxy_data or "error" in proxy_data:
+                    await asyncio.sleep(interval)
+                    continue
 
-                    # 2. 获取最新延迟
-                    proxy_data = await self._request("GET", "/proxies")
-                    if not proxy_data or "error" in proxy_data:
-                        continue
+                proxies = proxy_data["proxies"]
+                current_node = proxies[group_name]["now"]
 
+                for target, nodes in targets:
                     valid_nodes = []
                     for n in nodes:
-                        info = proxy_data["proxies"].get(n, {})
+                        info = proxies.get(n, {})
                         delay, _ = self._parse_delay(info.get("history", []))
                         if delay < 5000:  # 过滤超时
                             valid_nodes.append((n, delay))
@@ -187,10 +256,8 @@ class MihomoPlugin(Star):
                     best_node, best_delay = valid_nodes[0]
 
                     # 4. 检查是否需要切换
-                    current_node = proxy_data["proxies"][group_name]["now"]
-
                     # 只有当新节点比当前快 100ms 以上时才切换，避免抖动
-                    curr_info = proxy_data["proxies"].get(current_node, {})
+                    curr_info = proxies.get(current_node, {})
                     curr_delay, _ = self._parse_delay(curr_info.get("history", []))
 
                     if current_node != best_node:
@@ -203,8 +270,9 @@ class MihomoPlugin(Star):
                                 f"/proxies/{urllib.parse.quote(group_name)}",
                                 {"name": best_node},
                             )
+                            current_node = best_node
 
-                await asyncio.sleep(config.get("interval", 300))  # 默认等待时间
+                await asyncio.sleep(interval)
 
             except Exception as e:
                 logger.error(f"[Mihomo] Monitor loop error: {e}")
@@ -248,7 +316,7 @@ class MihomoPlugin(Star):
             if not data or "error" in data:
                 return
 
-            group_name_api, _ = await self._get_smart_group()
+            group_name_api, _ = self._pick_smart_group(data)
             all_nodes = data["proxies"][group_name_api]["all"]
 
             matched = [n for n in all_nodes if keyword.lower() in n.lower()]
@@ -268,7 +336,7 @@ class MihomoPlugin(Star):
                     self.data["custom_groups"][name].append(n)
                     added_count += 1
 
-            self._save_data()
+            self._dirty = True
             yield event.plain_result(
                 f"✅ 已将 {added_count} 个节点加入组 [{name}]\n当前共 {len(self.data['custom_groups'][name])} 个节点"
             )
@@ -276,7 +344,7 @@ class MihomoPlugin(Star):
         elif action == "del":
             if name in self.data["custom_groups"]:
                 del self.data["custom_groups"][name]
-                self._save_data()
+                self._dirty = True
                 yield event.plain_result(f"🗑️ 已删除组 [{name}]")
             else:
                 yield event.plain_result(f"❌ 组 [{name}] 不存在")
@@ -304,13 +372,13 @@ class MihomoPlugin(Star):
 
         if action == "start":
             self.data["auto_tasks"][target] = {"enable": True, "interval": 300}
-            self._save_data()
+            self._dirty = True
             yield event.plain_result(f"✅ 已启动 [{target}] 的自动优选 (每5分钟检测)")
 
         elif action == "stop":
             if target in self.data["auto_tasks"]:
                 del self.data["auto_tasks"][target]
-                self._save_data()
+                self._dirty = True
                 yield event.plain_result(f"🛑 已停止 [{target}] 的自动优选")
             else:
                 yield event.plain_result(f"❌ 未找到 [{target}] 的任务")
@@ -319,22 +387,17 @@ class MihomoPlugin(Star):
     @mihomo.command("speed")
     async def speed_cmd(self, event: AstrMessageEvent, target: str = ""):
         """测速: /mihomo speed [目标]"""
-        nodes = await self._resolve_nodes(target)
+        data = await self._request("GET", "/proxies")
+        nodes = await self._resolve_nodes(target, data)
         if not nodes:
             yield event.plain_result("❌ 未找到匹配节点")
             return
 
-        group_name, _ = await self._get_smart_group()
+        group_name, _ = self._pick_smart_group(data)
         yield event.plain_result(f"🚀 正在对 {len(nodes)} 个节点进行测速...")
 
-        # 触发API测速
-        encoded = urllib.parse.quote(group_name)
-        await self._request(
-            "GET",
-            f"/group/{encoded}/delay?url=http://www.gstatic.com/generate_204&timeout=2000",
-            timeout=3,
-        )
-        await asyncio.sleep(3)
+        # 触发API测速（近期已测过则复用结果）
+        await self._ensure_delay_test(group_name)
 
         # 获取结果
         data = await self._request("GET", "/proxies")
@@ -361,14 +424,14 @@ class MihomoPlugin(Star):
     @mihomo.command("group")
     async def group_cmd(self, event: AstrMessageEvent, target: str = ""):
         """列出节点: /mihomo group [目标]"""
-        group_name, _ = await self._get_smart_group()
-        nodes = await self._resolve_nodes(target)
+        # 一次拉取 /proxies，同时用于解析节点和获取当前状态
+        data = await self._request("GET", "/proxies")
+        group_name, _ = self._pick_smart_group(data)
+        nodes = await self._resolve_nodes(target, data)
         if not nodes:
             yield event.plain_result("❌ 未找到节点")
             return
 
-        # 获取当前状态
-        data = await self._request("GET", "/proxies")
         current = data["proxies"][group_name]["now"]
 
         mapping = {}
@@ -411,3 +474,12 @@ class MihomoPlugin(Star):
             "PUT", f"/proxies/{urllib.parse.quote(group)}", {"name": node}
         )
         yield event.plain_result(f"✅ 已切换至: {node}")
+
+    async def terminate(self):
+        """插件卸载时停止后台任务、写回未保存的数据并关闭 HTTP 会话"""
+        self.monitor_task.cancel()
+        self.flush_task.cancel()
+        if self._dirty:
+            self._save_data()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -3,6 +3,22 @@ import time
 from pathlib import Path
 from astrbot.api import logger
 
+# 常用语句提升为模块级常量，配合 sqlite3 的语句缓存复用已编译的语句
+_SQL_GET_USER = "SELECT offense_count, block_until_timestamp, last_offense_timestamp FROM offenses WHERE user_id = ?"
+_SQL_UPSERT_USER = '''
+    INSERT OR REPLACE INTO offenses (user_id, offense_count, block_until_timestamp, last_offense_timestamp)
+    VALUES (?, ?, ?, ?)
+'''
+_SQL_INSERT_LOG = '''
+    INSERT INTO offense_logs (user_id, user_name, group_id, offense_type, trigger_method, reason, offending_message, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_SQL_GET_USER_LOGS = """
+    SELECT timestamp, offense_type, reason, offending_message
+    FROM offense_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?
+"""
+
+
 class Database:
     def __init__(self, data_dir: Path):
         self.db_file = data_dir / "offenses.db"
@@ -12,6 +28,11 @@ class Database:
         try:
             self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
             cursor = self.conn.cursor()
+            # WAL 模式下读写互不阻塞；NORMAL 同步级别在 WAL 下仍可保证一致性
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-20000")
             # 用户状态表
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS offenses (
@@ -51,7 +72,7 @@ class Database:
     def get_user_data(self, user_id: str) -> dict:
         try:
             cursor = self.conn.cursor()
-            cursor.execute("SELECT offense_count, block_until_timestamp, last_offense_timestamp FROM offenses WHERE user_id = ?", (user_id,))
+            cursor.execute(_SQL_GET_USER, (user_id,))
             row = cursor.fetchone()
             if row:
                 return {"count": row[0], "block_until": row[1], "last_offense": row[2]}
@@ -63,10 +84,7 @@ class Database:
     def update_user_data(self, user_id: str, count: int, block_until: float, last_offense: float):
         try:
             cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO offenses (user_id, offense_count, block_until_timestamp, last_offense_timestamp)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, count, block_until, last_offense))
+            cursor.execute(_SQL_UPSERT_USER, (user_id, count, block_until, last_offense))
             self.conn.commit()
         except Exception as e:
             logger.error(f"NSFW Guard: 更新用户 {user_id} 失败: {e}")
@@ -74,10 +92,7 @@ class Database:
     def log_offense(self, user_id, user_name, group_id, offense_type, trigger_method, reason, message):
         try:
             cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO offense_logs (user_id, user_name, group_id, offense_type, trigger_method, reason, offending_message, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, user_name, group_id or "", offense_type, trigger_method, reason, message, time.time()))
+            cursor.execute(_SQL_INSERT_LOG, (user_id, user_name, group_id or "", offense_type, trigger_method, reason, message, time.time()))
             self.conn.commit()
         except Exception as e:
             logger.error(f"NSFW Guard: 记录日志失败: {e}")
@@ -100,10 +115,7 @@ class Database:
 
     def get_user_logs(self, user_id: str, limit=10):
         cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT timestamp, offense_type, reason, offending_message 
-            FROM offense_logs WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?
-        """, (user_id, limit))
+        cursor.execute(_SQL_GET_USER_LOGS, (user_id, limit))
         return cursor.fetchall()
 
     def get_all_offending_messages(self) -> list[str]:
@@ -536,6 +536,79 @@ class SignDatabase:
         async with self.conn.execute(query, (limit,)) as cursor:
             return await cursor.fetchall()
 
+    async def apply_coin_changes(self, changes: list[tuple[str, int, str]]):
+        """在一个事务中批量增减多个用户的金币并记录日志，全部成功或全部回滚。"""
+        await self._ensure_connected()
+        async with self._lock:
+            try:
+                await self.conn.execute("BEGIN")
+                await self.conn.executemany(
+                    "INSERT OR IGNORE INTO sign_data (user_id) VALUES (?)",
+                    [(user_id,) for user_id, _, _ in changes],
+                )
+                await self.conn.executemany(
+                    "UPDATE sign_data SET coins = coins + ? WHERE user_id = ?",
+                    [(amount, user_id) for user_id, amount, _ in changes],
+                )
+                await self.conn.executemany(
+                    "INSERT INTO coins_history (user_id, amount, reason) VALUES (?, ?, ?)",
+                    changes,
+                )
+                await self.conn.commit()
+            except Exception as e:
+                await self.conn.rollback()
+                logger.error(f"批量金币变动事务执行失败: {e}", exc_info=True)
+                raise
+
+    async def transfer_coins(
+        self,
+        from_user_id: str,
+        to_user_id: str,
+        amount: int,
+        from_reason: str,
+        to_reason: str,
+        allow_debt: bool = False,
+    ) -> bool:
+        """在一个事务中从一个用户向另一个用户转移金币。不允许欠款时，余额不足则不做任何变动并返回 False。"""
+        await self._ensure_connected()
+        async with self._lock:
+            try:
+                await self.conn.execute("BEGIN")
+                await self.conn.executemany(
+                    "INSERT OR IGNORE INTO sign_data (user_id) VALUES (?)",
+                    [(from_user_id,), (to_user_id,)],
+                )
+                if allow_debt:
+                    cursor = await self.conn.execute(
+                        "UPDATE sign_data SET coins = coins - ? WHERE user_id = ?",
+                        (amount, from_user_id),
+                    )
+                else:
+                    cursor = await self.conn.execute(
+                        "UPDATE sign_data SET coins = coins - ? WHERE user_id = ? AND coins >= ?",
+                        (amount, from_user_id, amount),
+                    )
+                if cursor.rowcount != 1:
+                    await self.conn.rollback()
+                    return False
+                await self.conn.execute(
+                    "UPDATE sign_data SET coins = coins + ? WHERE user_id = ?",
+                    (amount, to_user_id),
+                )
+                await self.conn.executemany(
+                    "INSERT INTO coins_history (user_id, amount, reason) VALUES (?, ?, ?)",
+                    [
+                        (from_user_id, -amount, from_reason),
+                        (to_user_id, amount, to_reason),
+                    ],
+                )
+                await self.conn.commit()
+                return True
+            except Exception as e:
+                await self.conn.rollback()
+                logger.error(f"金币转移事务执行失败: {e}", exc_info=True)
+                raise
+
     async def process_luck_change_card_usage(
         self,
         user_id: str,
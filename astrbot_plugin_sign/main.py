@@ -140,13 +140,22 @@ class EconomyAPI:
         (Async) 为指定用户增加或减少金币。
         此版本支持负数金币（欠款），扣款操作不会因余额不足而失败。
         """
+        return await self.add_coins_returning(user_id, amount, reason) is not None
+
+    async def add_coins_returning(
+        self, user_id: str, amount: int, reason: str
+    ) -> int | None:
+        """
+        (Async) 与 add_coins 相同，但直接返回变动后的余额，失败时返回 None。
+        调用方无需在加减金币后再调用一次 get_coins。
+        """
         try:
             safe_amount = round(float(amount))
         except (ValueError, TypeError):
             logger.error(
                 f"API add_coins 失败: 传入的 amount '{amount}' 不是有效的数字。"
             )
-            return False
+            return None
 
         current_coins = await self.get_coins(user_id)
         new_coins = current_coins + safe_amount
@@ -158,8 +167,68 @@ class EconomyAPI:
         result_text = f"余额变为 {new_coins}"
         if current_coins < 0 and new_coins > current_coins:
             result_text = f"偿还欠款后，余额变为 {new_coins}"
+        return new_coins
+
+    async def add_coins_bulk(self, entries: list[tuple[str, int, str]]) -> bool:
+        """
+        (Async) 在一个事务中批量增减多个用户的金币。
+        entries 为 (user_id, amount, reason) 列表，全部成功返回 True，任一失败则全部不生效并返回 False。
+        """
+        changes = []
+        for user_id, amount, reason in entries:
+            try:
+                safe_amount = round(float(amount))
+            except (ValueError, TypeError):
+                logger.error(
+                    f"API add_coins_bulk 失败: 传入的 amount '{amount}' 不是有效的数字。"
+                )
+                return False
+            changes.append((user_id, safe_amount, reason))
+        if not changes:
+            return True
+
+        try:
+            await self._db.apply_coin_changes(changes)
+        except Exception:
+            return False
         return True
 
+    async def atomic_transfer(
+        self,
+        from_user_id: str,
+        to_user_id: str,
+        amount: int,
+        from_reason: str,
+        to_reason: str,
+        allow_debt: bool = False,
+    ) -> bool:
+        """
+        (Async) 在一个事务中从 from_user_id 向 to_user_id 转移金币，两边要么都变动，要么都不变。
+        默认要求转出方余额充足，allow_debt 为 True 时允许转出方因此欠款。
+        """
+        try:
+            safe_amount = round(float(amount))
+        except (ValueError, TypeError):
+            logger.error(
+                f"API atomic_transfer 失败: 传入的 amount '{amount}' 不是有效的数字。"
+            )
+            return False
+        if safe_amount <= 0:
+            logger.error(f"API atomic_transfer 失败: 转移金额 {safe_amount} 必须为正。")
+            return False
+
+        try:
+            return await self._db.transfer_coins(
+                from_user_id,
+                to_user_id,
+                safe_amount,
+                from_reason,
+                to_reason,
+                allow_debt,
+            )
+        except Exception:
+            return False
+
     async def set_coins(self, user_id: str, amount: int, reason: str) -> bool:
         """
         (Async, 慎用) 直接设置指定用户的金币数量。
@@ -31,6 +31,16 @@ class StockMarketAPI:
     async def get_stock_price(self, ticker: str) -> float | None:
         return await self._plugin.api_get_stock_price(ticker)
 
+    async def get_stock_prices_batch(self, tickers: list[str]) -> dict[str, float]:
+        """批量查询股价，直接读取内存中的行情；不存在的代码不出现在结果中"""
+        stocks = self._plugin.stocks
+        prices = {}
+        for ticker in tickers:
+            stock = stocks.get(ticker.upper())
+            if stock is not None:
+                prices[ticker] = stock.current_price
+        return prices
+
     async def is_ticker_available(self, ticker: str) -> bool:
         return await self._plugin.api_is_ticker_available(ticker)
 
@@ -1,2 +1,42 @@
 # 这个文件非常简单，只包含一个全局字典，用作我们的“服务站”
-shared_services = {}
+import asyncio
+from typing import Any, Dict, List, Optional
+
+
+class ServiceRegistry(dict):
+    """服务站字典：用法与普通字典一致，额外支持在某个服务注册时立即唤醒等待者"""
+
+    def __init__(self):
+        super().__init__()
+        self._ready_events: Dict[str, List[asyncio.Event]] = {}
+
+    def __setitem__(self, name: str, service: Any):
+        super().__setitem__(name, service)
+        if service is not None:
+            for event in self._ready_events.pop(name, []):
+                event.set()
+
+    def register_ready_event(self, name: str, event: asyncio.Event):
+        """登记一个事件，在服务 name 注册时被 set；若服务已存在则立即 set"""
+        if self.get(name) is not None:
+            event.set()
+        else:
+            self._ready_events.setdefault(name, []).append(event)
+
+    async def wait_for(self, name: str, timeout: float) -> Optional[Any]:
+        """等待服务 name 注册，超时返回 None"""
+        event = asyncio.Event()
+        self.register_ready_event(name, event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            waiters = self._ready_events.get(name)
+            if waiters and event in waiters:
+                waiters.remove(event)
+                if not waiters:
+                    del self._ready_events[name]
+            return None
+        return self.get(name)
+
+
+shared_services = ServiceRegistry()